@@ -0,0 +1,144 @@
+# Bearing reactions and offsets from Shaftkit influence coefficients
+# reactions (kN) = straight reactions (kN) - influence (kN/mm) @ offsets (mm)
+
+import numpy as np
+
+
+def calc_reactions(straight_reactions, influence, offsets):
+    # Bearing reactions for offsets, shape (n_brgs,) or a batch (n_sets, n_brgs)
+    offsets = np.asarray(offsets, dtype=float)
+    return np.asarray(straight_reactions) - offsets @ np.asarray(influence).T
+
+
+class Alignment:
+    # Influence matrix of one model, reused for any number of offset sets
+    # Offsets are solved with least squares (minimum norm), the influence matrix
+    # is singular for straight line offsets so solutions are not unique
+
+    def __init__(self, straight_reactions, influence):
+        self.straight_reactions = np.asarray(straight_reactions, dtype=float)
+        self.influence = np.asarray(influence, dtype=float)
+        self.n_brgs = len(self.straight_reactions)
+
+        # pseudo inverse for each set of free bearings, calculated when first needed
+        self._pinv = dict()
+
+    @classmethod
+    def from_results(cls, results):
+        # from ShaftResults
+        return cls(results.straight_reactions, results.influence)
+
+    def reactions(self, offsets):
+        # Reactions (kN) for offsets (mm), one set (n_brgs,) or batch (n_sets, n_brgs)
+        return calc_reactions(self.straight_reactions, self.influence, offsets)
+
+    def pinv(self, free):
+        # Pseudo inverse of influence columns for free bearings
+        free = tuple(free)
+        if free not in self._pinv:
+            self._pinv[free] = np.linalg.pinv(self.influence[:, free])
+        return self._pinv[free]
+
+    def offsets(self, target_reactions, free=None, fixed_offsets=None):
+        # Offsets (mm) giving target reactions (kN), one set or batch (n_sets, n_brgs)
+        # free : indices of bearings that can move (default all), others held at
+        #        fixed_offsets (default 0), least squares fit when fewer free bearings
+        #        than reactions
+        target_reactions = np.asarray(target_reactions, dtype=float)
+        if free is None:
+            free = range(self.n_brgs)
+        free = sorted(free)
+        fixed = [i for i in range(self.n_brgs) if i not in free]
+
+        offsets = np.zeros(target_reactions.shape)
+        if fixed_offsets is not None:
+            offsets[..., fixed] = np.asarray(fixed_offsets, dtype=float)[..., fixed]
+
+        # influence[:, free] @ offsets[free] = straight - target - influence[:, fixed] @ offsets[fixed]
+        rhs = self.straight_reactions - target_reactions - offsets[..., fixed] @ self.influence[:, fixed].T
+        offsets[..., free] = rhs @ self.pinv(free).T
+        return offsets
+
+    def residual(self, offsets, target_reactions):
+        # Reactions for offsets minus target reactions (kN)
+        return self.reactions(offsets) - np.asarray(target_reactions, dtype=float)
+
+    def optimize(self, target_reactions=None, share=None, reaction_min=0.0, reaction_max=np.inf,
+                 offset_min=-np.inf, offset_max=np.inf, regularization=1e-6, tol=1e-3,
+                 max_iter=4000, rho=0.1, sigma=1e-6, alpha=1.6):
+        # Offsets (mm) closest to target reactions (kN) within reaction and offset bounds
+        # All arguments broadcast to (n_sets, n_brgs) (or (n_brgs,) for one set), so any
+        # number of scenarios are solved together
+        # target_reactions : wanted reactions, or share : fraction of total load on each
+        #                    bearing; with neither the smallest offsets meeting bounds are found
+        # reaction_min, reaction_max : reaction bounds (kN), default no negative (unloaded) reactions
+        # offset_min, offset_max : offset bounds (mm), equal values hold a bearing at that offset
+        # regularization : weight of offset size, picks smallest offsets among equal fits
+        # tol : allowed bound violation (kN, mm) for a set to count as feasible
+        # Returns dict of arrays: offsets, reactions, feasible, objective (kN^2), iterations
+        #
+        # Quadratic program min |A o - (S - T)|^2 + reg |o|^2, s.t. S - R_max <= A o <= S - R_min,
+        # O_min <= o <= O_max, solved by ADMM (as OSQP). The linear system only depends on the
+        # influence matrix, so it is inverted once and shared by all sets.
+        n = self.n_brgs
+        if target_reactions is None and share is not None:
+            target_reactions = np.asarray(share, dtype=float) * self.straight_reactions.sum()
+        bounds = [reaction_min, reaction_max, offset_min, offset_max]
+        if target_reactions is not None:
+            bounds.append(target_reactions)
+        shape = np.broadcast_shapes(*(np.shape(b) for b in bounds), (n,))
+        rmin, rmax, omin, omax = (np.broadcast_to(np.asarray(b, dtype=float), shape).reshape(-1, n)
+                                  for b in bounds[:4])
+
+        # reaction rows scaled by size of influence so offset and reaction rows are similar
+        scale = max(float(np.abs(self.influence).max()), 1e-12)
+        a = self.influence / scale
+        s = self.straight_reactions / scale
+        c = np.vstack((a, np.eye(n)))
+        p = a.T @ a + regularization * np.eye(n)
+        if target_reactions is None:
+            q = np.zeros((len(rmin), n))
+        else:
+            t = np.broadcast_to(np.asarray(target_reactions, dtype=float), shape).reshape(-1, n)
+            q = -(s - t / scale) @ a
+        low = np.hstack((s - rmax / scale, omin))
+        high = np.hstack((s - rmin / scale, omax))
+
+        kinv = np.linalg.inv(p + sigma * np.eye(n) + rho * c.T @ c)
+        x = np.zeros_like(q)
+        z = np.clip(x @ c.T, low, high)
+        y = np.zeros_like(z)
+        eps = tol / scale * 1e-2
+        for iterations in range(1, max_iter + 1):
+            xt = (sigma * x - q + (rho * z - y) @ c) @ kinv.T
+            zt = xt @ c.T
+            x = alpha * xt + (1 - alpha) * x
+            zr = alpha * zt + (1 - alpha) * z
+            z_new = np.clip(zr + y / rho, low, high)
+            y = y + rho * (zr - z_new)
+            z = z_new
+            if iterations % 25 == 0:
+                primal = np.abs(x @ c.T - z).max(initial=0)
+                dual = np.abs(x @ p + q + y @ c).max(initial=0)
+                if primal < eps and dual < eps:
+                    break
+
+        offsets = x.reshape(shape)
+        reactions = self.reactions(offsets)
+        flat = reactions.reshape(-1, n)
+        feasible = ((flat >= rmin - tol) & (flat <= rmax + tol)
+                    & (x >= omin - tol) & (x <= omax + tol)).all(axis=1)
+        if target_reactions is None:
+            objective = np.zeros(len(x))
+        else:
+            objective = ((flat - t)**2).sum(axis=1)
+        return dict({'offsets' : offsets, 'reactions' : reactions,
+                     'feasible' : feasible.reshape(shape[:-1]),
+                     'objective' : objective.reshape(shape[:-1]), 'iterations' : iterations})
+
+
+def best_alignments(solution, count=10):
+    # Indices of best feasible sets of Alignment.optimize solution (lowest objective first)
+    feasible = np.flatnonzero(np.ravel(solution['feasible']))
+    order = np.argsort(np.ravel(solution['objective'])[feasible], kind='stable')
+    return feasible[order[:count]]
@@ -0,0 +1,410 @@
+# Benchmarks for Shaftkit parser
+# Run: python benchmark.py [--elements 100000]
+#      python benchmark.py --scale [--sizes 100,10000] [--save-baseline FILE | --baseline FILE]
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from math import pi
+import numpy as np
+import instrument
+from alignment import Alignment, best_alignments
+from shaftmodel import assemble
+from shaftout import decode_fixed_width, parse_sections
+from spans import Spans
+from synthetic import write_shaft_out
+
+
+def synthetic_sections(n_elems, n_brgs=4, seed=0):
+    # Parsed sections (as from shaftout.parse_sections) for a synthetic model
+    rnd = random.Random(seed)
+    n_nodes = n_elems + 1
+    brg_nodes = [1 + round(k * n_elems / (n_brgs - 1)) for k in range(n_brgs)]
+
+    sections = dict()
+    sections['nodes'] = [[i+1, i * 0.05] for i in range(n_nodes)]
+    sections['elements'] = [[rnd.uniform(0.2, 0.6), rnd.uniform(0.0, 0.1), 2.06e11, 7.9e10, 7850.0]
+                            for _ in range(n_elems)]
+    sections['conc_masses'] = [[rnd.randint(1, n_nodes), 1, rnd.uniform(100, 5000)] for _ in range(10)]
+    sections['conc_springs'] = [[node, 1, 1e9] for node in brg_nodes]
+    sections['conc_damps'] = []
+    sections['disps'] = [[i+1, rnd.uniform(-1e-3, 1e-3), rnd.uniform(-1e-4, 1e-4)]
+                         for i in range(n_nodes)]
+    sections['beam_forces'] = [[i // 2 + 1, (i + 1) // 2 + 1, rnd.uniform(-1e4, 1e4),
+                                rnd.uniform(-1e5, 1e5)] for i in range(2 * n_elems)]
+    sections['inf'] = [[rnd.uniform(1e1, 1e2) for _ in range(n_brgs)]
+                       for _ in range(n_brgs + 1)]
+    return sections
+
+
+def assemble_loops(sections):
+    # Reference per element / per node arithmetic (as read_data before vectorizing)
+    # returns model rows, output rows and total element mass
+    nodes = sections['nodes']
+    elements = sections['elements']
+    disps = sections['disps']
+    beam_forces = sections['beam_forces']
+
+    model = elements.copy()
+    for i in range(len(elements)):
+        length = nodes[i+1][1] - nodes[i][1]
+        mass = (elements[i][0]**2 - elements[i][1]**2) * pi / 4 * elements[i][4] * length
+        inertia = pi / 64 * (elements[i][0]**4 - elements[i][1]**4)
+        secmod = inertia / (elements[i][0] / 2)
+        model[i] = [*model[i], length, mass, secmod, inertia]
+
+    output = []
+    bs = beam_forces[0][3] / 1000 * model[0][0] / 2 / model[0][8] / 1000
+    output.append([disps[0][1]*1000, disps[0][2]*1000,
+                   beam_forces[0][2]/1000, beam_forces[0][3]/1000, bs])
+    for i in range(1, len(nodes)-1):
+        bs = beam_forces[2*i-1][3] / 1000 * model[i][0] / 2 / model[i][8] / 1000
+        output.append([disps[i][1]*1000, disps[i][2]*1000, beam_forces[2*i][2]/1000,
+                       beam_forces[2*i-1][3]/1000, bs])
+    bs = beam_forces[-1][3] / 1000 * model[-1][0] / 2 / model[-1][8] / 1000
+    output.append([disps[-1][1]*1000, disps[-1][2]*1000,
+                   beam_forces[-1][2]/1000, beam_forces[-1][3]/1000, bs])
+
+    tmass_elems = 0
+    for elem in model:
+        tmass_elems += elem[6]
+    return model, output, tmass_elems
+
+
+# Largest relative difference from reference accepted by parity checks: per element / node
+# values, and values from sums over many elements (summation order differs)
+PARITY_TOL = 1e-12
+SUM_TOL = 1e-9
+
+
+def max_rel_diff(a, b):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    return float(np.max(np.abs(a - b) / np.maximum(np.abs(b), 1e-300)))
+
+
+def timed(func, *args, repeat=3):
+    # Best wall time of repeated calls, and last result
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def assembly_diffs(sections):
+    # Relative difference of assemble() from reference loops: model, output and element mass
+    results = assemble(sections, ['N/A'] * len(sections['conc_springs']))
+    model, output, tmass = assemble_loops(sections)
+    return (max_rel_diff(results.model.elements.T, model), max_rel_diff(results.output.T, output),
+            max_rel_diff(results.summary['Total Element Mass (kg)'], tmass))
+
+
+def bench_assembly(n_elems):
+    # Vectorized assemble() against reference loops: parity and throughput,
+    # returns True if within tolerance
+    sections = synthetic_sections(n_elems)
+    brg_names = ['N/A'] * len(sections['conc_springs'])
+
+    t_loops, _ = timed(assemble_loops, sections)
+    t_vec, _ = timed(assemble, sections, brg_names)
+
+    # without conversion of parsed lists to arrays
+    arrays = {key: np.array(rows, dtype=float) for key, rows in sections.items()}
+    t_arr, _ = timed(assemble, arrays, brg_names)
+
+    diffs = assembly_diffs(sections)
+    print(f'Model assembly, {n_elems} elements')
+    print(f'  model rel. diff   {diffs[0]:.2e}')
+    print(f'  output rel. diff  {diffs[1]:.2e}')
+    print(f'  mass rel. diff    {diffs[2]:.2e}')
+    print(f'  loops       {t_loops*1000:10.1f} ms  {n_elems/t_loops:12.0f} elements/s')
+    print(f'  vectorized  {t_vec*1000:10.1f} ms  {n_elems/t_vec:12.0f} elements/s')
+    print(f'  from arrays {t_arr*1000:10.1f} ms  {n_elems/t_arr:12.0f} elements/s')
+    return diffs[0] < PARITY_TOL and diffs[1] < PARITY_TOL and diffs[2] < SUM_TOL
+
+
+def decode_slicing(lines):
+    # Reference influence decoding, one 10 character slice at a time
+    inf = []
+    for row in lines:
+        num = int(len(row) / 10)
+        skip = len(row) - 10*num
+        inf.append([float(row[skip+i*10:skip+i*10+10]) for i in range(num)])
+    return inf
+
+
+def span_loops(x, length, od, brg_nodes):
+    # Reference span diameter, one element at a time (as read_data before prefix sums)
+    diameters = []
+    for k in range(len(brg_nodes) - 1):
+        node = brg_nodes[k] - 1
+        node2 = brg_nodes[k+1] - 1
+        total = 0
+        for j in range(node, node2):
+            total += length[j] * od[j]**2
+        diameters.append((total / (x[node2] - x[node]))**0.5)
+    return diameters
+
+
+def bench_spans(n_elems, n_brgs, seed=0):
+    # Prefix sum span metrics against reference loops: parity and throughput,
+    # returns True if within tolerance
+    rnd = random.Random(seed)
+    x = [i * 0.05 for i in range(n_elems + 1)]
+    length = [0.05] * n_elems
+    od = [rnd.uniform(0.2, 0.6) for _ in range(n_elems)]
+    brg_nodes = sorted(rnd.sample(range(1, n_elems + 2), n_brgs))
+
+    t_loops, reference = timed(span_loops, x, length, od, brg_nodes)
+    t_sums, metrics = timed(lambda: Spans(x, length, od, np.zeros(n_elems)).consecutive(brg_nodes))
+
+    # many arbitrary node pairs against prefix sums built once
+    spans = Spans(x, length, od, np.zeros(n_elems))
+    pairs = np.array([rnd.randint(1, n_elems + 1) for _ in range(2 * 100000)]).reshape(2, -1)
+    t_pairs, _ = timed(spans.metrics, pairs[0], pairs[1])
+
+    diff = max_rel_diff(metrics["diameter"], reference)
+    print(f'Bearing spans, {n_elems} elements, {n_brgs} bearings')
+    print(f'  diameter rel. diff {diff:.2e}')
+    print(f'  loops        {t_loops*1000:10.1f} ms')
+    print(f'  prefix sums  {t_sums*1000:10.1f} ms')
+    print(f'  node pairs   {t_pairs*1000:10.1f} ms  {pairs.shape[1]/t_pairs:12.0f} spans/s')
+    return diff < SUM_TOL
+
+
+def beam_influence(n_elems, brg_elems, length=40.0, ei=8e4):
+    # Influence matrix (kN/mm) of a uniform beam on bearings at element ends brg_elems,
+    # beam stiffness condensed to bearing vertical displacements (ei in kN m^2)
+    h = length / n_elems
+    k = ei / h**3 * np.array([[12, 6*h, -12, 6*h], [6*h, 4*h*h, -6*h, 2*h*h],
+                              [-12, -6*h, 12, -6*h], [6*h, 2*h*h, -6*h, 4*h*h]])
+    stiffness = np.zeros((2 * n_elems + 2, 2 * n_elems + 2))
+    for e in range(n_elems):
+        stiffness[2*e:2*e+4, 2*e:2*e+4] += k
+    b = [2 * i for i in brg_elems]
+    i = [j for j in range(len(stiffness)) if j not in b]
+    condensed = (stiffness[np.ix_(b, b)] - stiffness[np.ix_(b, i)]
+                 @ np.linalg.solve(stiffness[np.ix_(i, i)], stiffness[np.ix_(i, b)]))
+    return condensed / 1000
+
+
+def bench_alignment(n_brgs=6, n_sets=5000, seed=0):
+    # Batch alignment optimization: target load shares within reaction and offset bounds
+    rng = np.random.default_rng(seed)
+    influence = beam_influence(12 * (n_brgs - 1), [12 * k for k in range(n_brgs)])
+    straight = rng.uniform(100, 300, n_brgs)
+    alignment = Alignment(straight, influence)
+
+    # end bearings held at zero offset
+    offset_max = np.full(n_brgs, 5.0)
+    offset_max[[0, -1]] = 0
+    shares = rng.dirichlet(np.full(n_brgs, 5.0), n_sets)
+    max_reaction = 2 * straight.sum() / n_brgs
+    t_opt, solution = timed(lambda: alignment.optimize(share=shares, reaction_min=0.1 * max_reaction,
+                                                       reaction_max=max_reaction,
+                                                       offset_min=-offset_max, offset_max=offset_max),
+                            repeat=1)
+
+    best = best_alignments(solution, 1)
+    print(f'Alignment optimization, {n_brgs} bearings, {n_sets} scenarios')
+    print(f"  feasible    {int(solution['feasible'].sum()):10d}   iterations {solution['iterations']}")
+    print(f'  batch       {t_opt*1000:10.1f} ms  {n_sets/t_opt:12.0f} scenarios/s')
+    if len(best):
+        print(f"  best        {np.sqrt(solution['objective'][best[0]] / n_brgs):10.2f} kN rms from target")
+
+
+def bench_influence(n_brgs, seed=0):
+    # Bulk fixed width decoder against slicing: parity and throughput, returns True if identical
+    # lines have 0 to 9 leading characters and values with no whitespace between
+    rnd = random.Random(seed)
+    lines = []
+    for k in range(n_brgs + 1):
+        values = ''.join(f'{rnd.uniform(-1e7, 1e7):10.1f}'[-10:] for _ in range(n_brgs))
+        lines.append(' ' * (k % 10) + values)
+
+    t_slice, reference = timed(decode_slicing, lines)
+    t_bulk, decoded = timed(decode_fixed_width, lines)
+    same = all(list(a) == b for a, b in zip(decoded, reference))
+
+    print(f'Influence decoding, {n_brgs} bearings')
+    print(f'  identical values  {same}')
+    print(f'  slicing     {t_slice*1000:10.2f} ms  {n_brgs**2/t_slice:12.0f} values/s')
+    print(f'  bulk        {t_bulk*1000:10.2f} ms  {n_brgs**2/t_bulk:12.0f} values/s')
+    return same
+
+
+def bench_startup(exe=None, repeat=5):
+    # Start up time of new process importing parser, with and without plotting
+    # libraries, and of frozen executable (exe --help) if given
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = {'parser (no plots)' : [sys.executable, '-c', 'import parser'],
+                'parser + plots' : [sys.executable, '-c', 'import parser, plots']}
+    if exe:
+        commands['executable --help'] = [exe, '--help']
+
+    print(f'Start up, best of {repeat}')
+    for name, command in commands.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=here, check=True, stdout=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - start)
+        print(f'  {name:20} {best*1000:10.1f} ms')
+
+
+##############################################
+# Scale suite: parse, compute, csv and plots of synthetic SHAFT.OUT files
+
+SCALE_SIZES = (100, 1000, 10000, 100000, 1000000)
+SCALE_STAGES = ('parse', 'compute', 'csv', 'plots')
+
+
+def run_pipeline(filename, prefix, brg_names, plots=True):
+    # Stages of a single file run, as parser.process_file does them
+    from parser import output_csv
+    with instrument.stage('parse'):
+        sections = parse_sections(filename)
+    with instrument.stage('compute'):
+        results = assemble(sections, brg_names)
+    with instrument.stage('csv'):
+        model, output, brgs, inf, summary, conc_masses = results.as_lists()
+        output_csv(prefix + 'parser-output.csv', model, output, brgs, inf, summary)
+    if plots:
+        import plots as plotting
+        with instrument.stage('plots'):
+            plotting.create_plots(prefix + 'parser-', model, output, brgs, conc_masses, workers=1)
+
+
+def bench_scale(sizes=SCALE_SIZES, n_brgs=6, max_plot_nodes=100000, memory=True):
+    # Time (and trace peak memory of) each stage for synthetic files of each size
+    # Returns list of records: nodes, stage, wall, cpu, nodes_per_s, peak_mb, file_mb
+    records = []
+    brg_names = [f'B{k+1}' for k in range(n_brgs)]
+    directory = tempfile.mkdtemp(prefix='shaftkit-bench-')
+    print(f'Scale suite, {n_brgs} bearings')
+    try:
+        for n_nodes in sizes:
+            filename = os.path.join(directory, 'SHAFT.OUT')
+            write_shaft_out(filename, n_nodes, n_brgs)
+            file_mb = os.path.getsize(filename) / 1024**2
+            prefix = os.path.join(directory, '')
+            plots = n_nodes <= max_plot_nodes
+
+            # timings without tracemalloc overhead, then memory in a second run
+            recorder = instrument.start()
+            run_pipeline(filename, prefix, brg_names, plots)
+            stages = {r['stage']: r for r in recorder.report() if r['stage'] in SCALE_STAGES}
+            if memory:
+                recorder = instrument.start(memory=True)
+                run_pipeline(filename, prefix, brg_names, plots)
+                for record in recorder.report():
+                    if record['stage'] in stages:
+                        stages[record['stage']]['peak_mb'] = record['peak_mb']
+                tracemalloc.stop()
+            instrument.active = None
+
+            for name, record in stages.items():
+                records.append(dict({'nodes' : n_nodes, 'stage' : name, 'wall' : record['wall'],
+                                     'cpu' : record['cpu'],
+                                     'nodes_per_s' : n_nodes / max(record['wall'], 1e-9),
+                                     'peak_mb' : record['peak_mb'], 'file_mb' : file_mb}))
+            print_scale(records[-len(stages):])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return records
+
+
+def print_scale(records, baseline=None):
+    # Console table of scale records, with ratio to baseline wall time if given
+    def number(value, fmt):
+        return '' if value is None else format(value, fmt) + ' MB'
+
+    for r in records:
+        line = (f"  {r['nodes']:9d} nodes  {r['stage']:8} {r['wall']*1000:10.1f} ms "
+                f"{r['nodes_per_s']:12.0f} nodes/s {number(r['peak_mb'], '9.1f')}")
+        if baseline is not None:
+            base = baseline.get((r['nodes'], r['stage']))
+            line += '' if base is None else f"  x{r['wall'] / base['wall']:.2f} of baseline"
+        print(line)
+
+
+def save_baseline(filename, records):
+    # Store scale records with details of machine they were measured on
+    with open(filename, 'w') as file:
+        json.dump({'created' : time.strftime("%Y-%m-%d %H:%M:%S"),
+                   'machine' : {'platform' : platform.platform(), 'python' : platform.python_version(),
+                                'numpy' : np.__version__, 'cpus' : os.cpu_count()},
+                   'records' : records}, file, indent=1)
+
+
+def load_baseline(filename):
+    # (nodes, stage) : record from baseline file
+    with open(filename) as file:
+        data = json.load(file)
+    return {(r['nodes'], r['stage']): r for r in data['records']}
+
+
+def compare_baseline(records, baseline, tolerance=1.2):
+    # Print comparison to baseline, returns records slower than tolerance x baseline wall time
+    print('Compared to baseline')
+    print_scale(records, baseline)
+    slower = []
+    for r in records:
+        base = baseline.get((r['nodes'], r['stage']))
+        if base is not None and r['wall'] > tolerance * base['wall']:
+            slower.append(r)
+    for r in slower:
+        print(f"  SLOWER: {r['stage']} at {r['nodes']} nodes")
+    return slower
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description='Shaftkit parser benchmarks')
+    cli.add_argument('--elements', type=int, default=100000, help='number of elements in synthetic model')
+    cli.add_argument('--bearings', type=int, default=60, help='number of bearings for influence decoding')
+    cli.add_argument('--scenarios', type=int, default=5000, help='number of alignment optimization scenarios')
+    cli.add_argument('--startup', action='store_true', help='also time process start up (import) time')
+    cli.add_argument('--exe', help='frozen ShaftkitParser executable to time start up of')
+    cli.add_argument('--scale', action='store_true',
+                     help='run parse, compute, csv and plot stages on synthetic files of each size')
+    cli.add_argument('--sizes', default=','.join(map(str, SCALE_SIZES)),
+                     help='comma separated node counts for --scale')
+    cli.add_argument('--max-plot-nodes', type=int, default=100000,
+                     help='largest size to make plots for in --scale')
+    cli.add_argument('--no-memory', action='store_true', help='skip peak memory run in --scale')
+    cli.add_argument('--save-baseline', metavar='FILE', help='store --scale results to FILE')
+    cli.add_argument('--baseline', metavar='FILE', help='compare --scale results to FILE')
+    cli.add_argument('--tolerance', type=float, default=1.2,
+                     help='slow down factor reported as slower than baseline')
+    args = cli.parse_args()
+
+    if args.scale:
+        sizes = [int(size) for size in args.sizes.split(',')]
+        records = bench_scale(sizes, max_plot_nodes=args.max_plot_nodes, memory=not args.no_memory)
+        if args.save_baseline:
+            save_baseline(args.save_baseline, records)
+        if args.baseline:
+            sys.exit(1 if compare_baseline(records, load_baseline(args.baseline), args.tolerance) else 0)
+    else:
+        # parity checks, exit code 1 if any result differs from its reference
+        parity = dict()
+        parity['assembly'] = bench_assembly(args.elements)
+        parity['spans'] = bench_spans(args.elements, args.bearings)
+        parity['influence decoding'] = bench_influence(args.bearings)
+        bench_alignment(n_sets=args.scenarios)
+        if args.startup or args.exe:
+            bench_startup(args.exe)
+        failed = [name for name, ok in parity.items() if not ok]
+        if failed:
+            print(f'PARITY FAILED: {", ".join(failed)}')
+            sys.exit(1)
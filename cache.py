@@ -0,0 +1,125 @@
+# On disk cache of parsed SHAFT.OUT sections
+# Entries are NumPy .npz files named by SHA-256 of the file content and parser
+# version. A small stamp per source file (size, mtime) lets unchanged files skip
+# hashing. Least recently used entries are removed when cache is over size.
+
+import hashlib
+import json
+import os
+import numpy as np
+from shaftout import CASE_KEYS, PARSER_VERSION, SECTION_KEYS
+
+
+def file_hash(filename, chunk_size=1 << 20):
+    # SHA-256 of file content
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _replace(filename, write):
+    # Write file through temporary file so other processes never see a partial file
+    temp = f'{filename}.{os.getpid()}.tmp'
+    try:
+        write(temp)
+        os.replace(temp, filename)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+class SectionCache:
+    # Parsed sections cache in directory, limited to max_bytes on disk
+
+    def __init__(self, directory, max_bytes=500 * 1024**2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, 'stamps'), exist_ok=True)
+
+    def _stamp_file(self, filename):
+        name = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+        return os.path.join(self.directory, 'stamps', name + '.json')
+
+    def key(self, filename):
+        # Content hash of file, reused from stamp if size and mtime unchanged
+        stat = os.stat(filename)
+        stamp_file = self._stamp_file(filename)
+        try:
+            with open(stamp_file) as file:
+                stamp = json.load(file)
+            if stamp['size'] == stat.st_size and stamp['mtime'] == stat.st_mtime_ns:
+                return stamp['hash']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        stamp = dict({'size' : stat.st_size, 'mtime' : stat.st_mtime_ns,
+                      'hash' : file_hash(filename)})
+
+        def write(temp):
+            with open(temp, 'w') as file:
+                json.dump(stamp, file)
+        _replace(stamp_file, write)
+        return stamp['hash']
+
+    def entry(self, key):
+        return os.path.join(self.directory, f'{key}-v{PARSER_VERSION}.npz')
+
+    def load(self, filename):
+        # Cached sections (dict of 2D arrays) for file, or None if not cached
+        entry = self.entry(self.key(filename))
+        try:
+            with np.load(entry, allow_pickle=False) as data:
+                sections = {key: data[key] for key in SECTION_KEYS}
+                cases = [{key: sections[key] for key in CASE_KEYS}]
+                # load cases after first stored as case<n>_<key>
+                while f'case{len(cases)}_disps' in data:
+                    cases.append({key: data[f'case{len(cases)}_{key}'] for key in CASE_KEYS})
+                sections['cases'] = cases
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # mark as recently used
+        os.utime(entry)
+        return sections
+
+    def store(self, filename, sections):
+        # Save parsed sections for file, returns False if they can't be stored as arrays
+        try:
+            arrays = {key: np.asarray(sections[key], dtype=float) for key in SECTION_KEYS}
+            for n, case in enumerate(sections.get('cases', [])[1:], 1):
+                arrays.update({f'case{n}_{key}': np.asarray(case[key], dtype=float)
+                               for key in CASE_KEYS})
+        except ValueError:
+            # rows of different lengths
+            return False
+
+        def write(temp):
+            with open(temp, 'wb') as file:
+                np.savez(file, **arrays)
+        _replace(self.entry(self.key(filename)), write)
+        self.evict()
+        return True
+
+    def evict(self):
+        # Remove least recently used entries until cache is within max_bytes
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,152 @@
+# Comparison of runs against a baseline run (eg. alignment iterations)
+# Runs must share the baseline's nodes and bearings. Output blocks of all runs are
+# stacked, so deltas, maximum deltas and threshold exceedances of every run, node and
+# bearing are single array expressions however many runs are compared.
+
+import time
+from csv import writer
+import numpy as np
+
+# Compared quantity : (block, row) of ShaftResults output (5, nodes) or bearings (3, brgs)
+QUANTITIES = dict({'disp' : ('output', 0), 'moment' : ('output', 3), 'stress' : ('output', 4),
+                   'reaction' : ('bearings', 2)})
+
+# Quantity : column title
+TITLES = dict({'disp' : 'Deflection (mm)', 'moment' : 'Bending Moment (kNm)',
+               'stress' : 'Bending Stress (MPa)', 'reaction' : 'Reaction (kN)'})
+
+
+def same_layout(results, baseline):
+    # True if ShaftResults have the same nodes, node positions and bearing nodes
+    return (np.array_equal(results.node, baseline.node) and np.array_equal(results.x, baseline.x)
+            and np.array_equal(results.brg_node, baseline.brg_node))
+
+
+class Comparison:
+    # Deltas of runs against baseline (ShaftResults, same load case taken from each)
+    # names : name of each run (eg. file names), case : load case compared
+    # Raises ValueError if baseline or a run has no load case case, or a run has different
+    # nodes or bearings than baseline
+
+    def __init__(self, baseline, runs, names, case=0):
+        if not 0 <= case < baseline.n_cases:
+            raise ValueError(f'baseline has no load case {case + 1}, it has {baseline.n_cases}')
+        self.baseline = baseline.case(case)
+        self.names = list(names)
+        for name, run in zip(self.names, runs):
+            if not same_layout(run, baseline):
+                raise ValueError(f'{name} has different nodes or bearings than baseline')
+            if case >= run.n_cases:
+                raise ValueError(f'{name} has no load case {case + 1}, it has {run.n_cases}')
+
+        # stacked blocks of runs, shapes (runs, 5, nodes) and (runs, 3, bearings)
+        self.output = np.stack([run.case_output[case] for run in runs])
+        self.bearings = np.stack([run.case_bearings[case] for run in runs])
+
+    @property
+    def n_runs(self):
+        return len(self.names)
+
+    def values(self, quantity):
+        # Values of quantity for each run, shape (runs, nodes or bearings)
+        block, row = QUANTITIES[quantity]
+        return getattr(self, block)[:, row]
+
+    def deltas(self, quantity):
+        # Run value - baseline value, shape (runs, nodes or bearings)
+        block, row = QUANTITIES[quantity]
+        return self.values(quantity) - getattr(self.baseline, block)[row]
+
+    def max_deltas(self, quantity):
+        # Largest absolute delta of each run and node (or bearing) index where it is
+        delta = np.abs(self.deltas(quantity))
+        index = np.nan_to_num(delta, nan=-1).argmax(axis=1)
+        return delta[np.arange(self.n_runs), index], index
+
+    def exceedances(self, thresholds):
+        # Quantity : boolean (runs, nodes or bearings) where absolute delta is over threshold
+        # thresholds : quantity : threshold (same units as values), other quantities not checked
+        return {quantity: np.abs(self.deltas(quantity)) > threshold
+                for quantity, threshold in thresholds.items()}
+
+    def flagged(self, thresholds):
+        # Boolean (runs,), True for runs with any delta over its threshold
+        flagged = np.zeros(self.n_runs, dtype=bool)
+        for exceeds in self.exceedances(thresholds).values():
+            flagged |= exceeds.any(axis=1)
+        return flagged
+
+    def exceedance_rows(self, thresholds):
+        # [run, quantity, node or bearing, x (m), baseline, value, delta] of each exceedance
+        rows = []
+        for quantity, exceeds in self.exceedances(thresholds).items():
+            run, k = np.nonzero(exceeds)
+            if QUANTITIES[quantity][0] == 'output':
+                locations, x = self.baseline.node[k], self.baseline.x[k]
+            else:
+                locations, x = np.asarray(self.baseline.brg_names)[k], self.baseline.brg_x[k]
+            values = self.values(quantity)[run, k]
+            deltas = self.deltas(quantity)[run, k]
+            rows += [[self.names[r], quantity, location, *row]
+                     for r, location, row in zip(run.tolist(), locations.tolist(),
+                                                 np.column_stack((x, values - deltas, values,
+                                                                  deltas)).tolist())]
+        return rows
+
+
+def write_comparison(filename, comparison, thresholds=None):
+    # Summary, exceedances, bearing reaction deltas and node deltas of all runs to csv
+    # Raises PermissionError if file is open in another program (excel)
+    thresholds = thresholds or dict()
+    exceedances = comparison.exceedances(thresholds)
+    counts = sum(exceeds.sum(axis=1) for exceeds in exceedances.values()) if exceedances \
+        else np.zeros(comparison.n_runs, dtype=int)
+    baseline = comparison.baseline
+
+    with open(filename, 'w', newline='') as csvfile:
+        f = writer(csvfile)
+        f.writerow(['Shaftkit SHAFT.OUT parser comparison'])
+        f.writerow([time.strftime("%Y-%m-%d %H:%M")])
+        f.writerow(['Runs', comparison.n_runs])
+        for quantity, threshold in thresholds.items():
+            f.writerow([f'Threshold {TITLES[quantity]}', threshold])
+        f.writerow('')
+
+        f.writerow(['Run Summary (largest absolute delta from baseline)'])
+        header = ['Run']
+        columns = []
+        for quantity in QUANTITIES:
+            delta, index = comparison.max_deltas(quantity)
+            if QUANTITIES[quantity][0] == 'output':
+                header += [f'Max Delta {TITLES[quantity]}', 'Node']
+                columns += [delta.tolist(), baseline.node[index].tolist()]
+            else:
+                header += [f'Max Delta {TITLES[quantity]}', 'Bearing']
+                columns += [delta.tolist(), [baseline.brg_names[k] for k in index.tolist()]]
+        f.writerow(header + ['Exceedances'])
+        f.writerows(zip(comparison.names, *columns, counts.tolist()))
+        f.writerow('')
+        f.writerow('')
+
+        f.writerow(['Exceedances'])
+        f.writerow(['Run', 'Quantity', 'Node / Bearing', 'x (m)', 'Baseline', 'Value', 'Delta'])
+        f.writerows(comparison.exceedance_rows(thresholds))
+        f.writerow('')
+        f.writerow('')
+
+        f.writerow(['Bearing Reaction Delta (kN)'])
+        f.writerow(['Run', *baseline.brg_names])
+        f.writerows([name, *row] for name, row in zip(comparison.names,
+                                                       comparison.deltas('reaction').tolist()))
+        f.writerow('')
+        f.writerow('')
+
+        f.writerow(['Node Delta'])
+        quantities = [quantity for quantity in QUANTITIES if QUANTITIES[quantity][0] == 'output']
+        f.writerow(['Node', 'x (m)', *[f'{name} {TITLES[quantity]}' for name in comparison.names
+                                       for quantity in quantities]])
+        # (nodes, runs * quantities), quantities of each run next to each other
+        deltas = np.stack([comparison.deltas(quantity) for quantity in quantities], axis=1)
+        f.writerows([n, x, *row] for n, x, row in zip(baseline.node.tolist(), baseline.x.tolist(),
+                                                       deltas.reshape(comparison.n_runs * len(quantities),
+                                                                      -1).T.tolist()))
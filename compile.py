@@ -15,6 +15,7 @@ PyInstaller.__main__.run([
     '--log-level=INFO',
     '--add-data=parser-settings.ini;.',        # include data file
     '--add-data=README.MD;.',        # include data file
+    '--exclude-module=tkinter',        # plots use Agg canvas only, no gui backend
     #'--key encryption_key',
     #'--icon=./shaftkit/logo48x48.ico',
     '--noconfirm',                     # overwrite previous compiles without confirmation
@@ -0,0 +1,124 @@
+# CSV output of parsed Shaftkit results
+# Each section (summary, influence, model, output, bearings) is formatted into its
+# own text buffer, optionally in worker processes, and the file is written with a
+# single write. Input lists are never modified, so output can be written while
+# the same lists are being plotted.
+
+import io
+import time
+from csv import writer
+from concurrent.futures import ProcessPoolExecutor
+
+# Rows formatted per worker task
+CHUNK_ROWS = 20000
+
+# Section names, in order written to the combined file (envelope only with load cases)
+SECTIONS = ('summary', 'influence', 'model', 'output', 'bearings', 'envelope')
+
+# Section : title row in combined file
+TITLES = dict({'summary' : 'Model Summary', 'influence' : 'Bearing Influence (kN/mm',
+               'model' : 'Model', 'output' : 'Output', 'bearings' : 'Bearings',
+               'envelope' : 'Load Case Envelope'})
+
+# Section : column header row (None if section has no header)
+HEADERS = dict({
+    'summary' : None,
+    'influence' : None,
+    'model' : ['Element' , 'OD (m)', 'ID (m)', 'E (MPa)', 'G (MPa)',
+               'Density (kg/m^3)', 'Length (m)', 'Mass (kg)', 'Sec. Modulus (m^3)',
+               'Mom. Inertia (m^4)', 'Left x (m)', 'Right x (m)'],
+    'output' : ['Node', 'x (m)', 'Disp (mm)', 'Slope (mrad)',
+                'Shear (kN) Right End', 'Bending Moment (kNm) Left End', 'Bending Stress (MPa)'],
+    'bearings' : ['Node' , 'x (m)', 'Straight Reactions (kN)',
+                  'Calc Offsets (mm)', 'Calc Reactions (kN)', 'Name', 'L/D'],
+    'envelope' : ['Node', 'x (m)', 'Max Disp (mm)', 'Min Disp (mm)', 'Max Bending Moment (kNm)',
+                  'Min Bending Moment (kNm)', 'Max Bending Stress (MPa)', 'Min Bending Stress (MPa)']})
+
+
+def section_rows(model, output, brgs, inf, summary, envelope=None):
+    # Section : rows to write, model rows get left and right x of element (new lists)
+    sections = dict({'summary' : list(summary.items()),
+                     'influence' : inf,
+                     'model' : [[*elem, output[i][1], output[i+1][1]] for i, elem in enumerate(model)],
+                     'output' : output,
+                     'bearings' : brgs})
+    if envelope is not None:
+        sections['envelope'] = envelope
+    return sections
+
+
+def format_rows(rows, precision=None):
+    # Rows as CSV text, floats with precision significant digits (None for full precision)
+    buffer = io.StringIO(newline='')
+    f = writer(buffer)
+    if precision is None:
+        f.writerows(rows)
+    else:
+        fmt = f'.{precision}g'
+        f.writerows([format(v, fmt) if type(v) is float else v for v in row] for row in rows)
+    return buffer.getvalue()
+
+
+def format_section(name, rows, precision=None, title=True, text=None):
+    # Section as CSV text, title and header rows then values
+    # title : include title row and two blank rows after (combined file layout)
+    # text : values already formatted (format_rows), rows is then not used
+    buffer = io.StringIO(newline='')
+    f = writer(buffer)
+    if title:
+        f.writerow([TITLES[name]])
+    if HEADERS[name] is not None:
+        f.writerow(HEADERS[name])
+    if text is None:
+        text = format_rows(rows, precision)
+    text = buffer.getvalue() + text
+    if title:
+        text += '\r\n\r\n'
+    return text
+
+
+def format_sections(sections, precision=None, title=True, workers=1):
+    # Section : CSV text
+    # Unless workers is 1, rows are formatted in blocks of CHUNK_ROWS in worker processes
+    if workers == 1:
+        return {name: format_section(name, rows, precision, title) for name, rows in sections.items()}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: [pool.submit(format_rows, rows[k:k+CHUNK_ROWS], precision)
+                          for k in range(0, len(rows), CHUNK_ROWS)]
+                   for name, rows in sections.items()}
+        return {name: format_section(name, None, precision, title,
+                                     ''.join(future.result() for future in futures[name]))
+                for name in sections}
+
+
+def section_filename(filename, name):
+    # File name of one section, eg. parser-output.csv -> parser-output-model.csv
+    base, ext = (filename[:-4], filename[-4:]) if filename.lower().endswith('.csv') else (filename, '.csv')
+    return f'{base}-{name}{ext}'
+
+
+def write_csv(filename, model, output, brgs, inf, summary, precision=None, workers=1, split=False,
+              envelope=None):
+    # Write all sections to filename, or with split one file per section (header row then
+    # values, no title rows) named by section_filename
+    # envelope : rows of ShaftResults.envelope_lists, section is left out if None
+    # Returns list of files written
+    # Raises PermissionError if a file is open in another program (excel)
+    sections = section_rows(model, output, brgs, inf, summary, envelope)
+    names = [name for name in SECTIONS if name in sections]
+
+    if split:
+        texts = format_sections(sections, precision, False, workers)
+        files = []
+        for name in names:
+            files.append(section_filename(filename, name))
+            with open(files[-1], 'w', newline='') as csvfile:
+                csvfile.write(texts[name])
+        return files
+
+    texts = format_sections(sections, precision, True, workers)
+    head = f'Shaftkit SHAFT.OUT parser\r\n{time.strftime("%Y-%m-%d %H:%M")}\r\n'
+    with open(filename, 'w', newline='') as csvfile:
+        csvfile.write(head + ''.join(texts[name] for name in names))
+    return [filename]
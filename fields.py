@@ -0,0 +1,68 @@
+# Sampling of node results at any position along the shaft
+# Values between nodes are linearly interpolated, element found by searchsorted for
+# all positions at once. Shear and moment jump at nodes with loads or bearings, so
+# they are interpolated between the two end values of the element a position is in,
+# and side picks the element left or right of a position exactly at a node.
+
+import numpy as np
+
+# Quantities, same order as ShaftResults output block rows
+QUANTITIES = ('disp', 'slope', 'shear', 'moment', 'stress')
+
+
+class Fields:
+    # Node results of one load case
+    # x : node positions (m), output : ShaftResults output block (5, nodes)
+    # end_forces : shear left, shear right, moment left, moment right end of each element
+    #              (4, elements) (kN, kNm), None to interpolate shear and moment between nodes
+    # stress_factor : bending stress (MPa) per moment (kNm) of each element, None to interpolate
+    #                 stress between nodes
+
+    def __init__(self, x, output, end_forces=None, stress_factor=None):
+        self.x = np.asarray(x, dtype=float)
+        self.output = np.asarray(output, dtype=float)
+        self.end_forces = None if end_forces is None else np.asarray(end_forces, dtype=float)
+        self.stress_factor = None if stress_factor is None else np.asarray(stress_factor, dtype=float)
+        self.length = np.diff(self.x)
+
+    @classmethod
+    def from_results(cls, results, case=0):
+        # from ShaftResults (load case case)
+        model = results.model
+        end_forces = None if results.case_end_forces is None else results.case_end_forces[case]
+        return cls(model.x, results.case_output[case], end_forces,
+                   model.od / 2 / model.inertia / 1000)
+
+    def locate(self, positions, side='right'):
+        # Element index and fraction along element (0 to 1) of each position
+        # side : 'right' a position at a node is start of next element, 'left' end of previous
+        positions = np.asarray(positions, dtype=float)
+        n_elems = len(self.length)
+        elem = np.clip(np.searchsorted(self.x, positions, side=side) - 1, 0, n_elems - 1)
+        return elem, (positions - self.x[elem]) / self.length[elem]
+
+    def sample(self, positions, quantities=QUANTITIES, side='right'):
+        # Quantity name : values at positions (m), positions outside shaft are extrapolated
+        # from end elements
+        elem, t = self.locate(positions, side)
+        values = dict()
+        for name in quantities:
+            j = QUANTITIES.index(name)
+            from_ends = name in ('shear', 'moment') or (name == 'stress'
+                                                        and self.stress_factor is not None)
+            if self.end_forces is not None and from_ends:
+                k = 0 if name == 'shear' else 2
+                left, right = self.end_forces[k, elem], self.end_forces[k + 1, elem]
+                value = left + t * (right - left)
+                if name == 'stress':
+                    value = value * self.stress_factor[elem]
+            else:
+                left, right = self.output[j, elem], self.output[j, elem + 1]
+                value = left + t * (right - left)
+            values[name] = value
+        return values
+
+    def grid(self, n=1000, quantities=QUANTITIES):
+        # Positions of n evenly spaced points along shaft and quantity values at them
+        positions = np.linspace(self.x[0], self.x[-1], n)
+        return positions, self.sample(positions, quantities)
@@ -0,0 +1,95 @@
+# Shear, bending moment and stress at strain gauge nodes (gauge_nodes setting)
+# Values of all gauges and load cases are taken from the output block with one
+# indexed lookup. Gauge influence is the change of moment at each gauge per mm of
+# offset of each bearing: an offset changes reactions by -influence @ offsets, and
+# the moment at a gauge changes by those reactions left of it times their distance.
+
+import time
+from csv import writer
+import numpy as np
+
+# Output block rows of gauge values
+GAUGE_ROWS = dict({'shear' : 2, 'moment' : 3, 'stress' : 4})
+
+
+def parse_nodes(values):
+    # Node numbers from gauge_nodes setting (list of strings, or '' if not set)
+    return [int(value) for value in values if str(value).strip()]
+
+
+def node_rows(node, nodes):
+    # Row index in node arrays of each node number, -1 if not in model
+    node = np.asarray(node, dtype=int)
+    nodes = np.asarray(nodes, dtype=int)
+    lookup = np.full(max(node.max(initial=0), nodes.max(initial=0)) + 1, -1)
+    lookup[node] = np.arange(len(node))
+    return lookup[np.clip(nodes, 0, None)]
+
+
+class Gauges:
+    # Gauge values of one ShaftResults
+    # nodes : gauge node numbers, nodes not in model are left out with a note
+
+    def __init__(self, results, nodes):
+        self.results = results
+        rows = node_rows(results.node, nodes)
+        missing = [n for n, row in zip(nodes, rows) if row < 0]
+        if missing:
+            print(f'NOTE: Gauge nodes {", ".join(map(str, missing))} are not in model, not used.')
+        self.rows = rows[rows >= 0]
+        self.nodes = results.node[self.rows]
+        self.x = results.x[self.rows]
+
+    def values(self):
+        # Quantity : values at gauges, shape (cases, gauges)
+        block = self.results.case_output[:, list(GAUGE_ROWS.values())][:, :, self.rows]
+        return {name: block[:, k] for k, name in enumerate(GAUGE_ROWS)}
+
+    def influence(self):
+        # Moment change at each gauge per mm of offset of each bearing (kNm/mm),
+        # shape (gauges, bearings), from reactions of bearings left of each gauge
+        lever = self.x[:, None] - self.results.brg_x[None, :]
+        lever[lever < 0] = 0
+        return -lever @ self.results.influence
+
+    def rows_table(self):
+        # [case, node, x (m), shear (kN), moment (kNm), stress (MPa)] for each case and gauge
+        values = self.values()
+        table = []
+        for case in range(self.results.n_cases):
+            columns = [values[name][case].tolist() for name in GAUGE_ROWS]
+            for node, x, *row in zip(self.nodes.tolist(), self.x.tolist(), *columns):
+                table.append([case + 1, node, x, *row])
+        return table
+
+
+def write_gauges(filename, gauges):
+    # Gauge values and gauge influence of one run to csv
+    # Raises PermissionError if file is open in another program (excel)
+    with open(filename, 'w', newline='') as csvfile:
+        f = writer(csvfile)
+        f.writerow(['Shaftkit SHAFT.OUT parser gauges'])
+        f.writerow([time.strftime("%Y-%m-%d %H:%M")])
+        f.writerow(['Gauges'])
+        f.writerow(['Case', 'Node', 'x (m)', 'Shear (kN) Right End',
+                    'Bending Moment (kNm) Left End', 'Bending Stress (MPa)'])
+        f.writerows(gauges.rows_table())
+        f.writerow('')
+        f.writerow('')
+
+        f.writerow(['Gauge Influence (kNm/mm of bearing offset)'])
+        f.writerow(['Node', 'x (m)', *gauges.results.brg_names])
+        for node, x, row in zip(gauges.nodes.tolist(), gauges.x.tolist(),
+                                gauges.influence().tolist()):
+            f.writerow([node, x, *row])
+
+
+def write_batch_gauges(filename, results):
+    # Gauge values of all files of a batch in one table (results from parser.batch_file)
+    with open(filename, 'w', newline='') as csvfile:
+        f = writer(csvfile)
+        f.writerow(['File', 'Case', 'Node', 'x (m)', 'Shear (kN) Right End',
+                    'Bending Moment (kNm) Left End', 'Bending Stress (MPa)'])
+        for result in results:
+            for row in result.get('gauges', []):
+                f.writerow([result['file'], *row])
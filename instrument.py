@@ -0,0 +1,114 @@
+# Stage timing and profiling for Shaftkit parser
+# Code marks stages with `with instrument.stage('name'):`. Nothing is recorded
+# until start() is called, then each stage records wall time, CPU time and
+# (optionally) peak traced memory, and named stages can be run under cProfile.
+
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Recorder in use, None when not recording
+active = None
+
+
+class Recorder:
+    # Records of stages in order they started
+    # memory : trace peak memory with tracemalloc (slows down allocations)
+    # profile : stage names to run under cProfile, saved to profile-<name>.prof
+
+    def __init__(self, memory=False, profile=()):
+        self.memory = memory
+        self.profile = set(profile)
+        self.records = []
+        self.peaks = []         # running peak memory of open stages
+        self.profiling = False
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        record = dict({'stage' : name, 'depth' : len(self.peaks), 'wall' : None,
+                       'cpu' : None, 'peak_mb' : None})
+        self.records.append(record)
+
+        if self.memory:
+            # peak so far belongs to open stages, then measure this stage from zero
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peaks = [max(p, peak) for p in self.peaks]
+            tracemalloc.reset_peak()
+        self.peaks.append(0)
+
+        profiler = None
+        if name in self.profile and not self.profiling:
+            profiler = cProfile.Profile()
+            self.profiling = True
+            profiler.enable()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+                record['profile'] = f"profile-{name.replace(' ', '-')}.prof"
+                profiler.dump_stats(record['profile'])
+
+            peak = self.peaks.pop()
+            if self.memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                record['peak_mb'] = peak / 1024**2
+                self.peaks = [max(p, peak) for p in self.peaks]
+
+    def add(self, name, wall, cpu=None, peak_mb=None):
+        # Record a stage measured elsewhere (eg. in a worker process)
+        self.records.append(dict({'stage' : name, 'depth' : len(self.peaks), 'wall' : wall,
+                                  'cpu' : cpu, 'peak_mb' : peak_mb}))
+
+    def report(self):
+        # Records as list of dicts
+        return [dict(record) for record in self.records]
+
+    def write_json(self, filename):
+        with open(filename, 'w') as file:
+            json.dump({'created' : time.strftime("%Y-%m-%d %H:%M:%S"),
+                       'stages' : self.report()}, file, indent=1)
+
+    def table(self):
+        # Console table of records
+        def number(value, fmt):
+            return '' if value is None else format(value, fmt)
+
+        lines = [f"{'Stage':40} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak (MB)':>10}"]
+        for record in self.records:
+            name = '  ' * record['depth'] + record['stage']
+            lines.append(f"{name:40} {number(record['wall'], '9.3f')} "
+                         f"{number(record['cpu'], '9.3f')} {number(record['peak_mb'], '10.1f')}")
+        return '\n'.join(lines)
+
+
+def start(memory=False, profile=()):
+    # Start recording stages, returns recorder
+    global active
+    active = Recorder(memory, profile)
+    return active
+
+
+def stage(name):
+    # Context manager for a stage, does nothing if not recording
+    if active is None:
+        return nullcontext()
+    return active.stage(name)
+
+
+def add(name, wall, cpu=None, peak_mb=None):
+    # Record stage measured elsewhere, if recording
+    if active is not None:
+        active.add(name, wall, cpu, peak_mb)
@@ -0,0 +1,103 @@
+# Lateral natural frequencies of the shaft model (undamped, one plane)
+# Euler-Bernoulli beam elements with consistent mass, plus concentrated masses and
+# bearing springs, assembled as sparse matrices with two DOF per node
+# (displacement, rotation). Lowest modes are found with a shift-invert sparse
+# eigensolver. Imported only when modes are calculated, so scipy is not loaded
+# otherwise. CONC DAMP values are not used (undamped modes).
+#
+# Units as SHAFT.OUT: E (N/m^2), density (kg/m^3), lengths (m), masses (kg),
+# translational springs (N/m), DOF 1 of concentrated values is displacement and
+# DOF 2 rotation, other DOF are ignored.
+
+import time
+from csv import writer
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import eigsh
+
+# Concentrated value DOF : DOF offset within node
+NODE_DOFS = dict({1 : 0, 2 : 1})
+
+
+def element_matrices(length, ei, mass_per_length):
+    # Stiffness and consistent mass matrices of each element, shape (elements, 4, 4)
+    l = np.asarray(length, dtype=float)[:, None, None]
+    k = np.array([[12, 6, -12, 6], [6, 4, -6, 2], [-12, -6, 12, -6], [6, 2, -6, 4]], dtype=float)
+    m = np.array([[156, 22, 54, -13], [22, 4, 13, -3], [54, 13, 156, -22], [-13, -3, -22, 4]],
+                 dtype=float)
+    # powers of length for each entry (rotation DOF carry one length each)
+    p = np.array([0, 1, 0, 1])
+    power = p[:, None] + p[None, :]
+    stiffness = np.asarray(ei, dtype=float)[:, None, None] * k * l**(power - 3)
+    mass = (np.asarray(mass_per_length, dtype=float)[:, None, None] * l / 420) * m * l**power
+    return stiffness, mass
+
+
+def _concentrated(conc, n_dofs):
+    # Diagonal values of concentrated masses or springs on model DOF
+    diagonal = np.zeros(n_dofs)
+    for dof, offset in NODE_DOFS.items():
+        use = conc.dof == dof
+        np.add.at(diagonal, 2 * (conc.node[use] - 1) + offset, conc.value[use])
+    return diagonal
+
+
+def assemble_matrices(model):
+    # Sparse (csc) global stiffness and mass matrices of ShaftModel, 2 DOF per node
+    n_dofs = 2 * model.n_nodes
+    area = np.pi / 4 * (model.od**2 - model.id**2)
+    stiffness, mass = element_matrices(model.length, model.e * model.inertia, model.rho * area)
+
+    # DOF of each element matrix entry
+    dofs = 2 * np.arange(model.n_elements)[:, None] + np.arange(4)[None, :]
+    rows = np.broadcast_to(dofs[:, :, None], stiffness.shape).ravel()
+    cols = np.broadcast_to(dofs[:, None, :], stiffness.shape).ravel()
+    diagonal = np.arange(n_dofs)
+
+    k = coo_matrix((np.concatenate((stiffness.ravel(), _concentrated(model.conc_springs, n_dofs))),
+                    (np.concatenate((rows, diagonal)), np.concatenate((cols, diagonal)))),
+                   shape=(n_dofs, n_dofs)).tocsc()
+    m = coo_matrix((np.concatenate((mass.ravel(), _concentrated(model.conc_masses, n_dofs))),
+                    (np.concatenate((rows, diagonal)), np.concatenate((cols, diagonal)))),
+                   shape=(n_dofs, n_dofs)).tocsc()
+    return k, m
+
+
+def natural_modes(model, count=10):
+    # Lowest count natural frequencies (Hz) and mode shapes of ShaftModel
+    # Returns frequencies (count,) and displacement shapes (count, nodes), each shape
+    # scaled to largest displacement 1. Free (unsupported) shafts give zero frequency
+    # rigid body modes.
+    k, m = assemble_matrices(model)
+    count = min(count, k.shape[0] - 2)
+    if count < 1:
+        return np.zeros(0), np.zeros((0, model.n_nodes))
+
+    # shift (rad/s)^2 below zero so stiffness matrix of a free shaft can be factorized
+    shift = -1.0
+    values, vectors = eigsh(k, count, m, sigma=shift, which='LM')
+    order = np.argsort(values)
+    frequencies = np.sqrt(np.clip(values[order], 0, None)) / (2 * np.pi)
+    shapes = vectors[0::2, order].T
+    scale = shapes[np.arange(len(shapes)), np.abs(shapes).argmax(axis=1)]
+    return frequencies, shapes / scale[:, None]
+
+
+def write_modes(filename, model, frequencies, shapes):
+    # Natural frequencies and mode shapes to csv
+    # Raises PermissionError if file is open in another program (excel)
+    with open(filename, 'w', newline='') as csvfile:
+        f = writer(csvfile)
+        f.writerow(['Shaftkit SHAFT.OUT parser natural frequencies'])
+        f.writerow([time.strftime("%Y-%m-%d %H:%M")])
+        f.writerow(['Natural Frequencies (lateral undamped)'])
+        f.writerow(['Mode', 'Frequency (Hz)', 'Frequency (rpm)'])
+        for k, frequency in enumerate(frequencies.tolist()):
+            f.writerow([k + 1, frequency, frequency * 60])
+        f.writerow('')
+        f.writerow('')
+
+        f.writerow(['Mode Shapes (displacement)'])
+        f.writerow(['Node', 'x (m)', *[f'Mode {k + 1}' for k in range(len(frequencies))]])
+        f.writerows([n, x, *row] for n, x, row in zip(model.node.tolist(), model.x.tolist(),
+                                                      shapes.T.tolist()))
@@ -4,16 +4,24 @@
 # Use compile.py script to create exectuable
 # Run this (and compiled exe) from same directory as SHAFT.OUT
 
-from cmath import sqrt
 import os
+import sys
 import time
-from csv import reader, writer
+import argparse
+from csv import writer
+from functools import partial
 import configparser
-from math import pi
-from scipy.interpolate import interp1d
-from matplotlib.collections import PatchCollection, cm
-from matplotlib import pyplot as plt
-from matplotlib.patches import Polygon
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import freeze_support
+import instrument
+from shaftout import CASE_KEYS, SECTION_KEYS, ParseError, ParseErrors, parse_sections, section_digests
+from shaftmodel import assemble
+from cache import SectionCache
+from shaftbin import write_results, read_results as read_binary
+from csvout import write_csv
+from gauges import Gauges, parse_nodes, write_batch_gauges, write_gauges
+from compare import QUANTITIES as COMPARED, Comparison, same_layout, write_comparison
 
 def read_config(filename):
     # Config file
@@ -40,536 +48,626 @@ def read_config(filename):
         except KeyError:
             settings['gauge_nodes'] = ""
 
+        try:
+            settings['cache_location'] = config['settings']['cache_location']
+        except KeyError:
+            settings['cache_location'] = ""
+
+        try:
+            settings['cache_size_mb'] = int(config['settings']['cache_size_mb'])
+        except (KeyError, ValueError):
+            settings['cache_size_mb'] = 500
+
     else:
         # create default file
         settings['shaft_out_location'] = ''
         settings['brg_names'] = 'aft sterntube, fwd. sterntube, aft gear, fwd. gear'
         settings['gauge_nodes'] = ''
+        settings['cache_location'] = '.parser-cache'
+        settings['cache_size_mb'] = 500
         config['settings'] = {'shaft_out_location' : settings['shaft_out_location'],
                               'brg_names' : settings['brg_names'],
-                              'gauge_nodes' : settings['gauge_nodes']}
+                              'gauge_nodes' : settings['gauge_nodes'],
+                              'cache_location' : settings['cache_location'],
+                              'cache_size_mb' : settings['cache_size_mb']}
         with open(filename, 'w') as config_file:
             config.write(config_file)
             print(f'Created default {filename} file')
         pass
 
-def linspace(a, b, n=100):
-    # Generate points along range (instead of importing numpy library)
-    if n < 2:
-        return b
-    diff = (float(b) - a)/(n - 1)
-    return [diff * i + a  for i in range(n)]
-
-def read_data(filename):
-    # Read in SHAFT.OUT
-
-    ##############################################
-    # Initialize variables
-    nodes = []
-    elements = []
-    conc_masses = []
-    conc_springs = []
-    conc_damps = []
-    forces = []
-    spring_reacts = []
-    disps = []
-    beam_forces = []
-    brg_reacts = []
-    inf = []
-
-    ################################################
-    # open and read in output file
+def read_data(filename, errors=None):
+    # Read in SHAFT.OUT, returns nested lists
+    # model, output, brgs, inf, summary, conc_masses
+    # Raises OSError if file can't be read, ParseError (see read_results)
+    return read_results(filename, cache=open_cache(), errors=errors).as_lists()
+
+# Cache failure already reported (once per process)
+cache_warned = False
+
+def cache_failed(e):
+    # Report cache that can't be used, files are then parsed without it
+    global cache_warned
+    if not cache_warned:
+        print(f'NOTE: Section cache not used ({e})')
+        cache_warned = True
+
+def open_cache():
+    # Parsed sections cache from settings, None if not used or folder can't be created
+    if settings['cache_location'] == '':
+        return None
     try:
-        with open(filename, "r") as file:
-            data = [x.replace('\0', '') for x in file]
-            csvreader = reader(data, delimiter='\t')
-            for k, row in enumerate(csvreader):
-        
-                try:
-                    if row[0] == " NODES":
-                        row = next(csvreader)
-                        while row[0] != " ELEMEN DEF":
-                            x = row[0].split()
-                            nodes.append([int(x[0]), float(x[1])])
-                            row = next(csvreader)
-
-                    if row[0] == " BEAM TYPES ":
-                        row = next(csvreader)
-                        while row[0] != " CONC MASS":
-                            x = row[0].split()
-                            elements.append([float(x[0]), float(x[1]), float(x[2]), float(x[3]), float(x[4])])
-                            row = next(csvreader)
-
-                    if row[0] == " CONC MASS":
-                        row = next(csvreader)
-                        while row[0] != " CONC SPRING":
-                            x = row[0].split()
-                            conc_masses.append([int(x[0]), int(x[1]), float(x[2])])
-                            row = next(csvreader)
-
-                    if row[0] == " CONC SPRING":
-                        row = next(csvreader)
-                        while row[0] != " CONC DAMP":
-                            x = row[0].split()
-                            conc_springs.append([int(x[0]), int(x[1]), float(x[2])])
-                            row = next(csvreader)
-
-                    if row[0] == " CONC DAMP":
-                        row = next(csvreader)
-                        while row[0] != " Force No.   Type    Node   DOF":
-                            x = row[0].split()
-                            conc_damps.append([int(x[0]), int(x[1]), float(x[2])])
-                            row = next(csvreader)
-
-                    if row[0] == " Force No.   Type    Node   DOF":
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        while row[0] != "           SPRING REACTIONS":
-                            x = row[0].split()
-                            forces.append([int(x[0]), int(x[1]), int(x[2]), int(x[3]), float(x[4])])
-                            row = next(csvreader)
-
-                    if row[0] == "           SPRING REACTIONS":
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        while row[0] != "           DISPLACEMENTS":
-                            x = row[0].split()
-                            spring_reacts.append([int(x[0]), int(x[1]), float(x[2])])
-                            row = next(csvreader)
-
-                    if row[0] == "           DISPLACEMENTS":
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        while row[0] != "    BEAM FORCES":
-                            x = row[0].split()
-                            disps.append([int(x[0]), float(x[1]), float(x[2])])
-                            row = next(csvreader)
-
-                    if row[0] == "    BEAM FORCES":
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        while row[0] != "Bearing Reactions":
-                            x = row[0].split()
-                            beam_forces.append([int(x[0]), int(x[1]), float(x[2]),  float(x[3])])
-                            row = next(csvreader)
-
-                    if row[0] == "Bearing Reactions":
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        x = row[0].split()
-                        brg_reacts.append([float(x[0]), float(x[1]), float(x[2])])
-
-                    if row[0] == "Influence Coefficients":
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        row = next(csvreader)
-                        while len(row) != 0:
-                            # Characteres per value (since sometimes no whitespace between)
-                            num = int(len(row[0]) / 10)
-                            skip =  len(row[0]) - 10*num
-                            inf.append([float(row[0][skip+i*10:skip+i*10+10])/1000 for i in range(num)])
-                            row = next(csvreader)
-
-                # if row data exception, continue
-                except Exception as e:
-                    print(f'Line {k} Exception: {e}')
-                    pass
-    
-    # filename exception 
-    except Exception as e:
-        print(e)
-        quit()
-    
-
-    ############################################################
-    # Assemble model [element num, OD (m), ID (m), E (MPa), G (MPa), rho(kg/m^3),
-    #                 length (m), mass (kg), section modulus (m^3), mom. inertia (m^4)]
-    # Start with original read in data
-    model = elements.copy()
-
-    # for each line, calculate additional values and add to row
-    for i in range(len(elements)):
-            length = nodes[i+1][1] - nodes[i][1]
-            mass = (elements[i][0]**2 - elements[i][1]**2) * pi / 4 * elements[i][4] * length
-            inertia = pi / 64 * (elements[i][0]**4 - elements[i][1]**4)
-            secmod = inertia / (elements[i][0] / 2)
-            model[i] = [i+1, *model[i], length, mass, secmod, inertia]
-
-    # for v in zip(model):
-    #     print (v)
-
-    ############################################################
-    # Assemble output [node num, x (m), disp (mm), slope (mrad), shear (kN),
-    #                  bm (kNm), bs (MPa)]
-    # all values left side of element except last value (and bending moment in shaftkit is right side)
-    output = []
- 
-    # first node
-    bs =  beam_forces[0][3] /1000 * model[0][1]/2 / model[0][9] / 1000
-    output.append([nodes[0][0], nodes[0][1], disps[0][1]*1000, disps[0][2]*1000,
-                   beam_forces[0][2]/1000, beam_forces[0][3]/1000, bs])
-    
-    # remainder of nodes
-    for i in range(1, len(nodes)-1):
-        bs =  beam_forces[2*i-1][3] /1000 * model[i][1]/2 / model[i][9] / 1000
-        output.append([nodes[i][0], nodes[i][1], disps[i][1]*1000,
-                       disps[i][2]*1000, beam_forces[2*i][2]/1000,
-                       beam_forces[2*i-1][3]/1000,  bs])
-
-    # last node
-    beam_forces[-1][3] /1000 * model[-1][1]/2 / model[-1][9] / 1000
-    output.append([nodes[-1][0], nodes[-1][1], disps[-1][1]*1000, disps[-1][2]*1000,
-                   beam_forces[-1][2]/1000, beam_forces[-1][3]/1000, bs])
-
-    #############################################################
-    # Tabulate Sums
-    # Total nodes and elements
-    telems = len(model)
-    tlength = output[-1][1]
-
-    # Sum of Element Masses (kg)
-    tmass_elems = 0
-    for elem in model:
-        tmass_elems += elem[7]
-    
-    # Sum of Concentrated Masses (kg)
-    tmass_conc = 0
-    for mass in conc_masses:
-        tmass_conc += mass[2]
-    
-    # Sum of Total Model (kg) / (kN)
-    tmass = tmass_elems + tmass_conc
-    tweight = tmass * 9.81/1000
-    summary = dict({'Total Number of Elements' : telems,
-                    'Total Length' : tlength, 'Total Element Mass (kg)' : tmass_elems,
-                    'Total Concentrated Mass (kg)' : tmass_conc, 'Total Mass (kg)' : tmass,
-                    'Total Weight (kN)' : tweight})
-
-    #############################################################
-    # Clean up influence
-    straight_reactions = inf[0]
-    inf = inf[1:]
-
-    #############################################################
-    # Bearing details  [node, x (m), offset (mm), reactions (kN),
-    #                   offset (mm), reactions (kN), name, l/d ratio w/ next bearing]
-
-    # Setup offsets and reactions values
-    calc_offsets = [output[brg[0]-1][2] for brg in conc_springs]
-    calc_reactions = []
-    for j in range(len(inf)):
-        temp = 0
-        for i in range(len(inf[j])):
-            temp += inf[j][i] * calc_offsets[i]
-        calc_reactions.append(straight_reactions[j] - temp)
-
+        return SectionCache(settings['cache_location'], settings['cache_size_mb'] * 1024**2)
+    except OSError as e:
+        cache_failed(e)
+        return None
+
+def load_sections(filename, cache=None, errors=None):
+    # Parsed sections of SHAFT.OUT, from cache if file unchanged since last parse
+    # errors : ParseErrors bad lines are added to (see shaftout.parse_sections)
+    if errors is None:
+        errors = ParseErrors()
+    # cache is optional, if it fails the file is parsed (a missing file is reported by parse)
+    if cache is not None:
+        try:
+            with instrument.stage('cache load'):
+                sections = cache.load(filename)
+        except OSError as e:
+            if os.path.exists(filename):
+                cache_failed(e)
+            sections = None
+            cache = None
+        if sections is not None:
+            sections['errors'] = errors
+            return sections
+
+    # read in output file, one pass over file with a handler per section
+    with instrument.stage('parse'):
+        sections = parse_sections(filename, errors=errors)
+
+    # files with errors are parsed again each run so their errors are reported
+    if cache is not None and not errors:
+        try:
+            with instrument.stage('cache store'):
+                cache.store(filename, sections)
+        except OSError as e:
+            cache_failed(e)
+    return sections
+
+def read_results(filename, brg_names=None, cache=None, errors=None):
+    # Read in SHAFT.OUT, returns ShaftResults (array backed)
+    # brg_names defaults to names from settings file
+    # errors : ParseErrors bad lines are added to, default prints summary of any errors
+    # Raises OSError if file can't be read, ParseError on first bad line if errors is strict
+    # or if results can't be assembled from the sections read
+    report = errors is None
+    if report:
+        errors = ParseErrors()
+    if brg_names is None:
+        brg_names = settings['brg_names']
+
+    sections = load_sections(filename, cache, errors)
+    if report and errors:
+        print(errors.summary())
+    try:
+        return results_from_sections(sections, brg_names)
+    except (ValueError, IndexError, KeyError) as e:
+        raise ParseError(dict({'section' : 'results', 'line' : None, 'text' : '',
+                               'reason' : f'could not be assembled ({type(e).__name__}: {e}), '
+                                          f'{len(errors)} parse errors'})) from e
+
+def case_envelope(results):
+    # Envelope rows for csv when file has more than one load case, else None
+    if results.n_cases < 2:
+        return None
+    print(f'{results.n_cases} load cases, csv output is first case and envelope of all cases')
+    return results.envelope_lists()
+
+def results_from_sections(sections, brg_names):
+    # ShaftResults from parsed sections
     # Bearing Names
-    if len(settings['brg_names']) != len(conc_springs):
+    if len(brg_names) != len(sections['conc_springs']):
         print("NOTE: Bearing names in shaftkit-parser.ini does not match number of bearings in model, using 'N/A'.")
-        settings['brg_names'] = ["N/A" for x in conc_springs]
-    
-    # Write to bearing data object
-    brgs = []
-    for i in range(len(conc_springs)):
-        node = conc_springs[i][0] - 1
-
-        # Calculate bearing spacing
-        if i < len(conc_springs) - 1:
-            node2 = conc_springs[i+1][0] - 1
-        
-            brg1 = nodes[node][1]
-            brg2 = nodes[node2][1]
-            span = brg2 - brg1
-
-            # Calculate average diameter of span
-            total = 0
-            for j in range(node, node2):
-                total += model[j][6] * model[j][1]**2
-                print(j)
-            print(total)
-            ratio = sqrt(total / span)
-        else:
-            ratio = ""
+        brg_names = ["N/A" for x in sections['conc_springs']]
 
-        brgs.append([conc_springs[i][0], nodes[node][1],
-                     straight_reactions[i], calc_offsets[i], calc_reactions[i],
-                     settings['brg_names'][i].strip(), ratio])
+    return assemble(sections, [name.strip() for name in brg_names])
 
-    return model, output, brgs, inf, summary, conc_masses
-
-def output_csv(filename, model, output, brgs, inf, summary):
-    # Output all data to CSV
+def output_csv(filename, model, output, brgs, inf, summary, precision=None, workers=1, split=False,
+               envelope=None):
+    # Output all data to CSV (see csvout.write_csv), input lists are not changed
+    # precision : significant digits of floats, None for full precision
+    # split : one csv per section instead of single file
+    # envelope : load case envelope rows (ShaftResults.envelope_lists), None if one case
 
     # Will crash if csv file open in excel, so check first
     try:
-        csvfile = open(filename, "w", newline="")
-        f = writer(csvfile)
-
-        f.writerow(['Shaftkit SHAFT.OUT parser'])
-        f.writerow([time.strftime("%Y-%m-%d %H:%M")])
-
-        ##############################################
-        # write summary values
-        f.writerow(['Model Summary'])
-        for row in summary.items():
-            f.writerow(row)
-
-        f.writerow('')
-        f.writerow('')
-
-        ##############################################
-        # write influence
-        f.writerow(['Bearing Influence (kN/mm'])
-        for row in inf:
-            f.writerow(row)
-
-        f.writerow('')
-        f.writerow('')
-
-        #################################################
-        # write model
-        f.writerow(['Model'])
-        f.writerow(['Element' , 'OD (m)', 'ID (m)', 'E (MPa)', 'G (MPa)',
-                    'Density (kg/m^3)', 'Length (m)', 'Mass (kg)', 'Sec. Modulus (m^3)',
-                    'Mom. Inertia (m^4)', 'Left x (m)', 'Right x (m)'])
-        x = 0
-        for i, elem in enumerate(model):
-            # Add left and right x coordinate to table
-            elem.append(output[i][1])
-            elem.append(output[i+1][1])
-            f.writerow(elem)
-
-        f.writerow('')
-        f.writerow('')
-
-        ##############################################
-        # write output at nodes
-        f.writerow(['Output'])
-        f.writerow(['Node', 'x (m)', 'Disp (mm)', 'Slope (mrad)',
-                    'Shear (kN) Right End', 'Bending Moment (kNm) Left End', 'Bending Stress (MPa)'])
-        for node in output:
-            f.writerow(node)
-
-        f.writerow('')
-        f.writerow('')
-
-        ##############################################
-        # write bearings
-        f.writerow(['Bearings'])
-        f.writerow(['Node' , 'x (m)', 'Straight Reactions (kN)',
-                    'Calc Offsets (mm)', 'Calc Reactions (kN)', 'Name', 'L/D'])
-        for brg in brgs:
-            f.writerow(brg)
-
-        f.writerow('')
-        f.writerow('')
-
-        ##############################################
-        csvfile.close()
+        write_csv(filename, model, output, brgs, inf, summary, precision, workers, split, envelope)
     except PermissionError:
         print('Permission Error: Close output .csv file (excel maybe) before running')
         
-def create_output_plots(fileprefix, output, brgs):
-    # Transpose lists for plotting
-    data = list(zip(*output))
-    brgs_zip = list(zip(*brgs))
-    
-    # Axis lables
-    labels = ['Deflection (mm)', 'Slope (mrad)', 'Shear Force (kN)', 'Bending Moment (kNm)', 'Bending Stress (MPa)']
-    files = ['defl', 'slope', 'shear', 'moment', 'stress']
-
-    # Bearing offsets for deflection plot
-    offsets = brgs_zip[3]
-
-    #############################################
-    # Plot each
-    for j in range(len(labels)):
-        
-        # display settings for plot
-        plt.rcParams['figure.figsize'] = [12, 5]
-        plt.rcParams['figure.autolayout'] = True
-
-        # Increase x-axis limits by 2% at each end to prevent cropping        
-        length = output[-1][1]
-        plt.xlim(0-length*0.02, output[-1][1]*1.02)
-        plt.xlabel('Position (m)')
-
-        
-        if files[j] == 'shear' or files[j] == 'moment' :   
-            # Plot points
-            plt.plot(data[1], data[2+j], '', color='black')
-
-        else:
-            # Smooth out curve
-            list_x_new = linspace(min(data[1]), max(data[1]), 1000)
-            list_y_smooth = interp1d(data[1], data[2+j], kind='slinear')
-
-            # Plot points
-            # plt.plot(data[1], data[2+j], 'o', color='black')        
-
-            # Plot smooth curve
-            plt.plot(list_x_new, list_y_smooth(list_x_new), '-' , color='black')
-
-        #####################################################        
-        # Plot bearings
-        plt.plot(brgs_zip[1], offsets, '^', markersize = 15, color='red')
-        plt.ylabel(labels[j])
-
-        # Add bearing names
-
-
-        ######################################################
-        # Y axis lable, make larger??
-        #fig.text(0.06, 0.5, 'Relative Displacement', ha='center', va='center', rotation='vertical')
-
-        plt.grid()
-
-        # save plot
-        # old file was not being overwritten without os.remove
-        strFile = fileprefix + files[j] + '.png'
-        if os.path.isfile(strFile):
-            os.remove(strFile)
-        plt.savefig(strFile)
-
-        # clear all plot settings
-        plt.close('all')
-
-        # show bearings at zero after 1st plot (deflection)
-        offsets = [0 for x in brgs_zip[4]]
-# add bearing names
+def create_output_plots(fileprefix, output, brgs, workers=1):
+    # Plot each output quantity to fileprefix + name + .png
+    # plotting libraries are only loaded when plots are made
+    import plots
+    return plots.create_output_plots(fileprefix, output, brgs, workers)
 
 def create_model_plot(filename, model, output, brgs, conc_masses):
     # Plot model to image file
+    import plots
+    return plots.create_model_plot(filename, model, output, brgs, conc_masses)
+
+def create_plots(fileprefix, model, output, brgs, conc_masses, workers=None, only=None):
+    # All output plots and model plot (or only those named), rendered in turn unless workers > 1
+    import plots
+    return plots.create_plots(fileprefix, model, output, brgs, conc_masses, workers, only)
+
+def output_gauges(filename, results, gauge_nodes):
+    # Write gauge table of results, returns gauge rows (empty if no gauge nodes)
+    if not gauge_nodes:
+        return []
+    gauges = Gauges(results, gauge_nodes)
+    try:
+        write_gauges(filename, gauges)
+    except PermissionError:
+        print('Permission Error: Close gauges .csv file (excel maybe) before running')
+    return gauges.rows_table()
+
+def output_modes(filename, results, count):
+    # Lowest count natural frequencies and mode shapes to csv
+    # scipy is only loaded when modes are calculated
+    import modal
+    frequencies, shapes = modal.natural_modes(results.model, count)
+    try:
+        modal.write_modes(filename, results.model, frequencies, shapes)
+    except PermissionError:
+        print('Permission Error: Close modes .csv file (excel maybe) before running')
+    return frequencies
+
+def process_file(filename, brg_names, prefix='', cache=None, binary=False, plot_workers=None,
+                 plots=True, gauge_nodes=(), strict=False):
+    # Parse one SHAFT.OUT and write csv (and binary, gauges) and plots with file names starting
+    # with prefix
+    # Returns wall time (s) of each stage, gauge rows as 'gauges' and number of parse errors
+    # as 'parse_errors'
+    # strict : raise ParseError on first bad line instead of skipping it
+    times = dict()
+    start = time.perf_counter()
+    errors = ParseErrors(strict=strict)
+    results = read_results(filename, brg_names, cache, errors)
+    times['parse_errors'] = len(errors)
+    model, output, brgs, inf, summary, conc_masses = results.as_lists()
+    times['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output_csv(prefix + 'parser-output.csv', model, output, brgs, inf, summary,
+               envelope=case_envelope(results))
+    if binary:
+        write_results(prefix + 'parser-output.shaftbin', results)
+    times['gauges'] = output_gauges(prefix + 'parser-gauges.csv', results, gauge_nodes)
+    times['csv'] = time.perf_counter() - start
+
+    if plots:
+        start = time.perf_counter()
+        times['plot_times'] = create_plots(prefix + 'parser-', model, output, brgs, conc_masses,
+                                           plot_workers)
+        times['plots'] = time.perf_counter() - start
+    return times
+
+def batch_file(filename, brg_names, cache=None, binary=False, plots=True, gauge_nodes=(),
+               strict=False):
+    # Process one file of batch, outputs are written next to it as <name>-parser-...
+    # Failures are returned in the result instead of raised
+    result = dict({'file' : filename, 'status' : 'ok', 'error' : '', 'parse_errors' : '',
+                   'read' : '', 'csv' : '', 'plots' : '', 'total' : ''})
+    prefix = os.path.splitext(filename)[0] + '-'
+    start = time.perf_counter()
+    try:
+        result.update(process_file(filename, brg_names, prefix, cache, binary, 1, plots,
+                                   gauge_nodes, strict))
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['total'] = time.perf_counter() - start
+    return result
+
+def find_files(pattern):
+    # SHAFT.OUT files from a directory (*.OUT, including sub folders) or glob pattern
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '**', '*.OUT')
+    return sorted(glob(pattern, recursive=True))
+
+def run_batch(pattern, brg_names, workers=None, filename='parser-batch-summary.csv', cache=None,
+              binary=False, plots=True, gauge_nodes=(), strict=False):
+    # Process all files matching pattern across a process pool
+    # and write summary with per file status, parse errors and timing (and gauges of all files)
+    files = find_files(pattern)
+    if not files:
+        print(f'No files found for {pattern}')
+        return []
+
+    print(f'Processing {len(files)} files')
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(batch_file, file, brg_names, cache, binary, plots, gauge_nodes, strict)
+                for file in files]
+        for job in as_completed(jobs):
+            result = job.result()
+            results.append(result)
+            print(f"{result['status']:6} {result['total']:7.2f} s  {result['file']}  {result['error']}")
+
+    # summary in same order as files
+    results.sort(key=lambda result: files.index(result['file']))
+    failed = sum(result['status'] != 'ok' for result in results)
+    total = time.perf_counter() - start
 
-    plt.rcParams['figure.figsize'] = [10, 4]
-    plt.rcParams['figure.autolayout'] = True
-    fig, ax = plt.subplots()
-    elements = []
-    y_max = 0
-
-    ##########################################################
-    # Plot element properties
-    for i in range(len(model)):
-
-        # Set corners of each element
-        left = output[i][1]
-        right = output[i+1][1]
-        top = model[i][1] / 2
-        bottom = -top
-
-        # save max diameter
-        if top > y_max: y_max = top
-
-        # Shape to plot
-        rect = [[left, top],
-                [left, bottom],
-                [right, bottom],
-                [right, top],
-                [left, top]]
-
-        # Add as polygon
-        polygon = Polygon(xy=rect, closed=True)
-        elements.append(polygon)
-
-    # plot concentrated masses
-    for mass in conc_masses:
-        left = output[mass[0] - 1][1]
-        right = output[mass[0]][1]
-        top = model[mass[0] - 1][1] * 2/3
-        
-        if mass[2] > 0: 
-            ax.annotate("",
-                        xy=(left, top),
-                        xytext = (left, top + 0.25),
-                        arrowprops=dict(facecolor='blue', width = 2.5, headwidth = 7.5, headlength = 5),
-                        horizontalalignment='center', verticalalignment='top')
-
-    # Assign elements to be plot and colors
-    p = PatchCollection(elements, cmap=cm.jet, alpha=0.4)
-    p.set_edgecolor('black')
-    p.set_facecolor(None)
-
-    ##############################################################
-    # x-axis settings
-    plt.xlim(0 - model[-1][1] * 1.05, output[-1][1] * 1.05)
-    plt.xlabel('Location (m)')
-
-    # y-axis settings
-    if y_max < 1: y_max = 1
-    else: y_max = 1.5 * y_max
-    
-    plt.ylim(-y_max, y_max)
-    plt.ylabel('Diameter (m)')
-
-    #############################################################
-    # Assign bearings to plot
-    brg_x = [brg[1] for brg in brgs] 
-    brg_y = [-model[brg[0]-1][1] for brg in brgs]
-    ax.plot(brg_x, brg_y, '^', markersize=10, color='red')
-
-    # # Add bearing naming
-    # brg_names = [brg[5] for brg in brgs]
-    # for i, brg in enumerate(brgs):
-    #     # vertical plotting position
-    #     txt = ax.annotate(brg[5],  xy=(brg_x[i], y_max * -0.75), ha='center', size=10, color='gray', wrap=True)
-    #     txt._get_wrap_line_width = lambda : 50.
-
-    ax.add_collection(p)
-
-    ###########################################################
-    # save plot
-    # old file was not being overwritten without os.remove
-    if os.path.isfile(filename):
-        os.remove(filename)
-    plt.savefig(filename)
-
-    # clear all plot settings
-    plt.close('all')
-# Scale plot based on model width and max OD
-# show ID
-# Scale marker size based on # of elements
-# arrows for concentrated mass
-# plot title cut off
-# arrows for concentrated masses?
-# add bearing names?
+    try:
+        with open(filename, "w", newline="") as csvfile:
+            f = writer(csvfile)
+            f.writerow(['Shaftkit SHAFT.OUT parser batch'])
+            f.writerow([time.strftime("%Y-%m-%d %H:%M")])
+            f.writerow(['Files', len(results)])
+            f.writerow(['Failed', failed])
+            f.writerow(['Total Time (s)', total])
+            f.writerow('')
+            columns = ['file', 'status', 'error', 'parse_errors', 'read', 'csv', 'plots', 'total']
+            f.writerow(['File', 'Status', 'Error', 'Parse Errors', 'Read (s)', 'CSV (s)', 'Plots (s)',
+                        'Total (s)'])
+            for result in results:
+                f.writerow([result[key] for key in columns])
+    except PermissionError:
+        print('Permission Error: Close output .csv file (excel maybe) before running')
+
+    if gauge_nodes:
+        try:
+            write_batch_gauges(os.path.splitext(filename)[0] + '-gauges.csv', results)
+        except PermissionError:
+            print('Permission Error: Close gauges .csv file (excel maybe) before running')
+
+    print(f'Finished {len(results)} files, {failed} failed, {total:.1f} s')
+    return results
+
+def load_run(filename, brg_names, cache=None):
+    # ShaftResults of SHAFT.OUT or parser-output.shaftbin file, and number of parse errors
+    if filename.endswith('.shaftbin'):
+        return read_binary(filename), 0
+    errors = ParseErrors()
+    return read_results(filename, brg_names, cache, errors), len(errors)
+
+def parse_thresholds(values):
+    # Quantity : threshold from NAME=VALUE strings (eg. disp=0.05 reaction=10)
+    thresholds = dict()
+    for value in values:
+        name, _, threshold = value.partition('=')
+        if name not in COMPARED:
+            raise ValueError(f'unknown threshold {name}, use {", ".join(COMPARED)}')
+        thresholds[name] = float(threshold)
+    return thresholds
+
+def compare_runs(baseline, patterns, brg_names, thresholds=None, case=0, workers=None,
+                 fileprefix='parser-compare', cache=None, plots=True):
+    # Compare runs (files matching patterns, see find_files) against baseline file and write
+    # fileprefix.csv and overlay plots fileprefix-<quantity>.png
+    # Files that can't be read or don't match baseline nodes are reported and left out
+    # Raises ValueError if baseline has no load case case
+    files = [file for pattern in patterns for file in (find_files(pattern) or [pattern])]
+    files = [file for file in dict.fromkeys(files) if file != baseline]
+    if not files:
+        print(f'No files to compare for {" ".join(patterns)}')
+        return None
+
+    start = time.perf_counter()
+    base, _ = load_run(baseline, brg_names, cache)
+    if not 0 <= case < base.n_cases:
+        raise ValueError(f'{baseline} has no load case {case + 1}, it has {base.n_cases}')
+    loaded = dict()
+    def collect(file, result):
+        try:
+            loaded[file] = result()
+        except Exception as e:
+            print(f'failed  {file}  {type(e).__name__}: {e}')
+    if workers == 1 or len(files) < 2:
+        for file in files:
+            collect(file, partial(load_run, file, brg_names, cache))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = {file: pool.submit(load_run, file, brg_names, cache) for file in files}
+            for file, job in jobs.items():
+                collect(file, job.result)
+
+    runs, names = [], []
+    for file, (results, errors) in loaded.items():
+        if errors:
+            print(f'NOTE: {file} has {errors} parse errors')
+        if not same_layout(results, base):
+            print(f'NOTE: {file} has different nodes or bearings than baseline, not compared')
+            continue
+        if case >= results.n_cases:
+            print(f'NOTE: {file} has no load case {case + 1}, not compared')
+            continue
+        runs.append(results)
+        names.append(file)
+    if not runs:
+        print('No runs to compare')
+        return None
+
+    comparison = Comparison(base, runs, names, case)
+    try:
+        write_comparison(fileprefix + '.csv', comparison, thresholds)
+    except PermissionError:
+        print('Permission Error: Close comparison .csv file (excel maybe) before running')
+    if plots:
+        import plots as plotting
+        plotting.create_overlay_plots(fileprefix + '-', comparison)
+
+    flagged = comparison.flagged(thresholds or dict())
+    print(f'Compared {comparison.n_runs} runs with {baseline}, {int(flagged.sum())} over thresholds, '
+          f'{time.perf_counter() - start:.1f} s')
+    return comparison
+
+def serve_results(default_file, host='127.0.0.1', port=8050, capacity=8):
+    # Serve parsed results of files in current folder over local HTTP until Ctrl+C (see service.py)
+    import service
+    cache = open_cache()
+    def load(filename, errors):
+        return read_results(filename, cache=cache, errors=errors)
+    service.serve(service.Service(service.ResultsCache(load, capacity), '.', default_file), host, port)
+
+# Outputs : sections (and settings) they are calculated from, for watch mode
+OUTPUT_DEPENDS = dict({
+    'csv' : {'nodes', 'elements', 'conc_masses', 'conc_springs', 'disps', 'beam_forces', 'inf',
+             'brg_names'},
+    'defl' : {'nodes', 'conc_springs', 'disps'},
+    'slope' : {'nodes', 'conc_springs', 'disps'},
+    'shear' : {'nodes', 'conc_springs', 'beam_forces'},
+    'moment' : {'nodes', 'conc_springs', 'beam_forces'},
+    'stress' : {'nodes', 'elements', 'conc_springs', 'beam_forces'},
+    'model' : {'nodes', 'elements', 'conc_masses', 'conc_springs'},
+    'gauges' : {'nodes', 'elements', 'conc_springs', 'beam_forces', 'inf', 'brg_names',
+                'gauge_nodes'}})
+
+def file_stamp(filename):
+    # (size, modified time) of file, None if missing
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+class Watcher:
+    # Watch SHAFT.OUT and settings file, keep parsed sections in memory and on a change
+    # re-parse only changed sections and re-write only outputs that depend on them
+
+    def __init__(self, settings_file, plot_workers=None, plots=True):
+        self.settings_file = settings_file
+        self.plot_workers = plot_workers
+        self.plots = plots
+        self.filename = None
+        self.stamps = dict()
+        self.digests = dict()
+        self.sections = None
+        self.brg_names = None
+        self.gauge_nodes = None
+
+    def changed_files(self):
+        # Files with new size or modified time since last check
+        files = [self.settings_file]
+        if self.filename is not None:
+            files.append(self.filename)
+        stamps = {filename: file_stamp(filename) for filename in files}
+        changed = [filename for filename in files if stamps[filename] != self.stamps.get(filename)]
+        self.stamps.update(stamps)
+        return changed
+
+    def update(self):
+        # Re-parse changed sections and re-write dependent outputs
+        # Watcher state is kept only once outputs are written, so a failed update (eg. results
+        # that can't be assembled) is tried again against the last good state on next change
+        start = time.perf_counter()
+        changed = set()
+
+        read_config(self.settings_file)
+        filename = settings['shaft_out_location'] or 'SHAFT.OUT'
+        sections, old_digests = self.sections, self.digests
+        if filename != self.filename:
+            # new file, parse everything
+            sections, old_digests = None, dict()
+        brg_names = settings['brg_names']
+        if brg_names != self.brg_names:
+            changed.add('brg_names')
+        gauge_nodes = parse_nodes(settings['gauge_nodes'])
+        if gauge_nodes != self.gauge_nodes:
+            changed.add('gauge_nodes')
+
+        digests = section_digests(filename)
+        keys = {key for key in digests.keys() | old_digests.keys()
+                if digests.get(key) != old_digests.get(key)}
+        errors = ParseErrors()
+        if sections is None:
+            sections = parse_sections(filename, errors=errors)
+            keys = set(SECTION_KEYS)
+        elif keys:
+            # load cases are split by their order in file, so parse all result sections together
+            # (only changed sections are marked changed)
+            cases = bool(keys & set(CASE_KEYS))
+            parse = keys | set(CASE_KEYS) if cases else keys
+            parsed = parse_sections(filename, keys=parse, errors=errors)
+            sections = dict(sections)
+            for key in parse:
+                sections[key] = parsed[key]
+            if cases:
+                sections['cases'] = parsed['cases']
+        changed |= keys
+        if errors:
+            print(errors.summary())
+
+        outputs = [name for name, depends in OUTPUT_DEPENDS.items() if depends & changed]
+        if not gauge_nodes:
+            outputs = [name for name in outputs if name != 'gauges']
+        if not self.plots:
+            outputs = [name for name in outputs if name in ('csv', 'gauges')]
+        if outputs:
+            results = results_from_sections(sections, brg_names)
+            model, output, brgs, inf, summary, conc_masses = results.as_lists()
+            if 'csv' in outputs:
+                output_csv('parser-output.csv', model, output, brgs, inf, summary,
+                           envelope=case_envelope(results))
+            if 'gauges' in outputs:
+                output_gauges('parser-gauges.csv', results, gauge_nodes)
+            plot_names = [name for name in outputs if name not in ('csv', 'gauges')]
+            if plot_names:
+                create_plots('parser-', model, output, brgs, conc_masses, self.plot_workers, plot_names)
+
+        if filename != self.filename:
+            self.filename = filename
+            self.stamps[filename] = file_stamp(filename)
+        self.sections, self.digests = sections, digests
+        self.brg_names, self.gauge_nodes = brg_names, gauge_nodes
+        if not outputs:
+            print(f'{time.strftime("%H:%M:%S")} no output changes')
+            return
+        print(f'{time.strftime("%H:%M:%S")} changed: {", ".join(sorted(changed))}')
+        print(f'         updated: {", ".join(outputs)} ({time.perf_counter() - start:.2f} s)')
+
+    def run(self, interval=1.0):
+        # Check files every interval (s) until Ctrl+C
+        print(f'Watching {self.settings_file} and SHAFT.OUT, Ctrl+C to stop')
+        try:
+            while True:
+                if self.changed_files():
+                    # wait for file to finish being written
+                    time.sleep(interval)
+                    while self.changed_files():
+                        time.sleep(interval)
+                    try:
+                        self.update()
+                    except Exception as e:
+                        print(f'{time.strftime("%H:%M:%S")} {type(e).__name__}: {e}')
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print('Stopped watching')
 
 if __name__ == "__main__":
+    freeze_support()
+    cli = argparse.ArgumentParser(description='Shaftkit MSA SHAFT.OUT parser')
+    cli.add_argument('--batch', metavar='PATH', help='directory (all *.OUT files) or glob pattern of files to process')
+    cli.add_argument('--workers', type=int, help='number of processes for batch (default all cpus)')
+    cli.add_argument('--summary', default='parser-batch-summary.csv', help='batch summary csv file')
+    cli.add_argument('--watch', action='store_true', help='keep running, update outputs when SHAFT.OUT or settings change')
+    cli.add_argument('--compare', nargs='+', metavar='FILE',
+                     help='compare runs (SHAFT.OUT or .shaftbin files, folders or glob patterns) with first file, '
+                          'writes parser-compare.csv and overlay plots')
+    cli.add_argument('--threshold', action='append', default=[], metavar='NAME=VALUE',
+                     help=f'flag compared runs with delta over VALUE, NAME one of {", ".join(COMPARED)}')
+    cli.add_argument('--case', type=int, default=1, help='load case compared (from 1)')
+    cli.add_argument('--serve', type=int, nargs='?', const=8050, metavar='PORT',
+                     help='serve parsed results and plots as JSON / PNG on local port (default 8050)')
+    cli.add_argument('--host', default='127.0.0.1', help='address to serve on (default this computer only)')
+    cli.add_argument('--no-plots', action='store_true', help='only write csv (plotting libraries are not loaded)')
+    cli.add_argument('--plot-workers', type=int, help='number of processes rendering plots (default one per CPU, 1 renders in turn)')
+    cli.add_argument('--precision', type=int, help='significant digits of csv values (default full precision)')
+    cli.add_argument('--csv-workers', type=int, default=1, help='number of processes formatting csv values')
+    cli.add_argument('--split-csv', action='store_true', help='write one csv per section (parser-output-model.csv etc.)')
+    cli.add_argument('--modes', type=int, default=0, metavar='N',
+                     help='also write lowest N lateral natural frequencies and mode shapes to parser-modes.csv')
+    cli.add_argument('--strict', action='store_true', help='stop at first malformed line of SHAFT.OUT instead of skipping it')
+    cli.add_argument('--max-errors', type=int, default=100, metavar='N',
+                     help='number of parse errors kept for the report (all are counted)')
+    cli.add_argument('--binary', action='store_true', help='also write parser-output.shaftbin (memory mappable binary)')
+    cli.add_argument('--timings', action='store_true', help='print time of each stage and write parser-timings.json')
+    cli.add_argument('--trace-memory', action='store_true', help='also record peak memory of each stage (slower)')
+    cli.add_argument('--profile', action='append', default=[], metavar='STAGE',
+                     help='run stage (eg. parse, csv, plots) under cProfile, saved to profile-STAGE.prof')
+    args = cli.parse_args()
+    # stages are recorded in this process for one file, batch reports its own times per file
+    if (args.timings or args.trace_memory or args.profile) and \
+            (args.watch or args.serve is not None or args.compare or args.batch):
+        cli.error('--timings, --trace-memory and --profile only apply to a single run, '
+                  'not --watch, --serve, --compare or --batch')
+
+    recorder = None
+    if args.timings or args.trace_memory or args.profile:
+        recorder = instrument.start(args.trace_memory, args.profile)
+
     # read in config file
     filename = 'parser-settings.ini'
     read_config(filename)
 
+    if args.watch:
+        Watcher(filename, args.plot_workers, not args.no_plots).run()
+        sys.exit()
+
+    if args.serve is not None:
+        serve_results(settings['shaft_out_location'] or 'SHAFT.OUT', args.host, args.serve)
+        sys.exit()
+
+    if args.compare:
+        try:
+            thresholds = parse_thresholds(args.threshold)
+            compare_runs(args.compare[0], args.compare[1:], settings['brg_names'], thresholds,
+                         args.case - 1, args.workers, cache=open_cache(), plots=not args.no_plots)
+        except (OSError, ValueError) as e:
+            print(e)
+            sys.exit(1)
+        sys.exit()
+
+    if args.batch:
+        run_batch(args.batch, settings['brg_names'], args.workers, args.summary, open_cache(),
+                  args.binary, not args.no_plots, parse_nodes(settings['gauge_nodes']), args.strict)
+        sys.exit()
+
     # read in SHAFT.OUT and config file
     if settings['shaft_out_location'] == '':
         filename = 'SHAFT.OUT'
     else:
         filename = settings['shaft_out_location']
     
-    model, output, brgs, inf, summary, conc_masses = read_data(filename)
-
-    # output to csv
-    filename = 'parser-output.csv'
-    output_csv(filename, model, output, brgs, inf, summary)
+    errors = ParseErrors(args.max_errors, args.strict)
+    try:
+        with instrument.stage('read'):
+            results = read_results(filename, cache=open_cache(), errors=errors)
 
-    # create plots
-    fileprefix = 'parser-output-'
-    create_output_plots(fileprefix, output, brgs)
+    # filename exception, bad line in strict mode or sections missing
+    except (OSError, ParseError) as e:
+        if errors:
+            print(errors.summary())
+        print(e)
+        sys.exit(1)
+    if errors:
+        print(errors.summary())
+    model, output, brgs, inf, summary, conc_masses = results.as_lists()
 
-    # create model graphic
-    filename = 'parser-model.png'
-    create_model_plot(filename, model, output, brgs, conc_masses)
+    # output to csv
+    with instrument.stage('csv'):
+        filename = 'parser-output.csv'
+        output_csv(filename, model, output, brgs, inf, summary, args.precision, args.csv_workers,
+                   args.split_csv, case_envelope(results))
+    if args.binary:
+        with instrument.stage('binary'):
+            write_results('parser-output.shaftbin', results)
+    with instrument.stage('gauges'):
+        output_gauges('parser-gauges.csv', results, parse_nodes(settings['gauge_nodes']))
+    if args.modes:
+        with instrument.stage('modes'):
+            frequencies = output_modes('parser-modes.csv', results, args.modes)
+        print('Natural frequencies (Hz): ' + ', '.join(f'{f:.2f}' for f in frequencies))
+
+    # create plots and model graphic
+    if not args.no_plots:
+        start = time.perf_counter()
+        with instrument.stage('plots'):
+            fileprefix = 'parser-'
+            plot_times = create_plots(fileprefix, model, output, brgs, conc_masses, args.plot_workers)
+            for filename, (wall, cpu) in plot_times.items():
+                instrument.add(filename, wall, cpu)
+        if recorder is None:
+            for filename, (wall, cpu) in plot_times.items():
+                print(f'{filename:32} {wall:6.2f} s')
+            # whole stage, including loading matplotlib and starting worker processes
+            print(f'{"plots (total)":32} {time.perf_counter() - start:6.2f} s')
+
+    if recorder is not None:
+        print(recorder.table())
+        recorder.write_json('parser-timings.json')
 
     print('Finished')
     time.sleep(2.5)
@@ -0,0 +1,227 @@
+# Plots for Shaftkit parser
+# Imported by parser.py only when plots are made, so runs without plots don't
+# load matplotlib
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+import compare
+
+# Output plots, axis labels and file name endings
+PLOT_LABELS = ['Deflection (mm)', 'Slope (mrad)', 'Shear Force (kN)', 'Bending Moment (kNm)', 'Bending Stress (MPa)']
+PLOT_FILES = ['defl', 'slope', 'shear', 'moment', 'stress']
+
+# figure (and axes) of each size, reused for following plots in same process
+figures = dict()
+
+def plot_figure(size):
+    # Cleared figure template with single axes, Agg canvas (no pyplot state)
+    if size not in figures:
+        fig = Figure(figsize=size, tight_layout=True)
+        FigureCanvasAgg(fig)
+        figures[size] = (fig, fig.add_subplot())
+    fig, ax = figures[size]
+    ax.clear()
+    return fig, ax
+
+def save_figure(fig, filename):
+    # save plot to file name or open binary file (png)
+    # old file was not being overwritten without os.remove
+    if isinstance(filename, str) and os.path.isfile(filename):
+        os.remove(filename)
+    fig.savefig(filename, format='png')
+
+def render_output_plot(filename, j, x, y, brg_x, brg_y):
+    # Plot one output quantity (PLOT_FILES[j]) along shaft
+    # returns filename and (wall, cpu) time (s)
+    start = time.perf_counter()
+    cpu = time.process_time()
+    fig, ax = plot_figure((12, 5))
+
+    # Increase x-axis limits by 2% at each end to prevent cropping
+    length = x[-1]
+    ax.set_xlim(0-length*0.02, length*1.02)
+    ax.set_xlabel('Position (m)')
+
+    # node values joined by straight lines, same as linear interpolation between nodes
+    # (use fields.Fields to sample between nodes)
+    ax.plot(x, y, '-', color='black')
+
+    #####################################################
+    # Plot bearings
+    ax.plot(brg_x, brg_y, '^', markersize=15, color='red')
+    ax.set_ylabel(PLOT_LABELS[j])
+    ax.grid()
+
+    save_figure(fig, filename)
+    return filename, (time.perf_counter() - start, time.process_time() - cpu)
+
+def render_model_plot(filename, x, od, brg_x, brg_od, mass_x, mass_od):
+    # Plot model elements, bearings and concentrated masses
+    # returns filename and (wall, cpu) time (s)
+    start = time.perf_counter()
+    cpu = time.process_time()
+    fig, ax = plot_figure((10, 4))
+
+    ##########################################################
+    # Plot element properties, one collection of rectangles
+    x = np.asarray(x)
+    top = np.asarray(od) / 2
+    left = x[:-1]
+    right = x[1:len(top)+1]
+    rects = np.stack([np.column_stack(corner) for corner in
+                      ((left, top), (left, -top), (right, -top), (right, top), (left, top))], axis=1)
+    ax.add_collection(PolyCollection(rects, closed=True, alpha=0.4, edgecolor='black'))
+
+    # plot concentrated masses
+    for left, mass_od in zip(mass_x, mass_od):
+        top = mass_od * 2/3
+        ax.annotate("",
+                    xy=(left, top),
+                    xytext = (left, top + 0.25),
+                    arrowprops=dict(facecolor='blue', width = 2.5, headwidth = 7.5, headlength = 5),
+                    horizontalalignment='center', verticalalignment='top')
+
+    ##############################################################
+    # x-axis settings
+    ax.set_xlim(0 - od[-1] * 1.05, x[-1] * 1.05)
+    ax.set_xlabel('Location (m)')
+
+    # y-axis settings
+    y_max = max(od) / 2
+    if y_max < 1: y_max = 1
+    else: y_max = 1.5 * y_max
+
+    ax.set_ylim(-y_max, y_max)
+    ax.set_ylabel('Diameter (m)')
+
+    #############################################################
+    # Assign bearings to plot
+    ax.plot(brg_x, [-od for od in brg_od], '^', markersize=10, color='red')
+
+    # # Add bearing naming
+    # for i, brg_name in enumerate(brg_names):
+    #     # vertical plotting position
+    #     txt = ax.annotate(brg_name,  xy=(brg_x[i], y_max * -0.75), ha='center', size=10, color='gray', wrap=True)
+    #     txt._get_wrap_line_width = lambda : 50.
+
+    save_figure(fig, filename)
+    return filename, (time.perf_counter() - start, time.process_time() - cpu)
+# Scale plot based on model width and max OD
+# show ID
+# Scale marker size based on # of elements
+# plot title cut off
+# add bearing names?
+
+def render_overlay_plot(filename, label, x, baseline, values, names, brg_x, brg_y):
+    # Plot quantity of many runs (values, shape (runs, points)) over baseline, all runs
+    # drawn as one line collection, legend only when few runs
+    # returns filename and (wall, cpu) time (s)
+    start = time.perf_counter()
+    cpu = time.process_time()
+    fig, ax = plot_figure((12, 5))
+
+    length = x[-1]
+    ax.set_xlim(0-length*0.02, length*1.02)
+    ax.set_xlabel('Position (m)')
+
+    x = np.asarray(x)
+    lines = LineCollection([np.column_stack((x, y)) for y in values], linewidths=1,
+                           colors=[f'C{k % 10}' for k in range(len(values))],
+                           alpha=1 if len(values) <= 10 else 0.3)
+    ax.add_collection(lines)
+    ax.plot(x, baseline, '--', color='black', linewidth=1.5, label='baseline')
+    if len(values) <= 10:
+        for k, name in enumerate(names):
+            ax.plot([], [], '-', color=f'C{k % 10}', label=name)
+        ax.legend(fontsize='small')
+    ax.autoscale_view()
+
+    ax.plot(brg_x, brg_y, '^', markersize=15, color='red')
+    ax.set_ylabel(label)
+    ax.grid()
+
+    save_figure(fig, filename)
+    return filename, (time.perf_counter() - start, time.process_time() - cpu)
+
+def overlay_plot_jobs(fileprefix, comparison):
+    # (function, arguments) for overlay plot of each compared output quantity (compare.Comparison)
+    baseline = comparison.baseline
+    jobs = []
+    for quantity, (block, row) in compare.QUANTITIES.items():
+        if block != 'output':
+            continue
+        # bearings at their offset on deflection plot, at zero on others
+        brg_y = baseline.offset if quantity == 'disp' else np.zeros(len(baseline.brg_node))
+        jobs.append((render_overlay_plot, (fileprefix + quantity + '.png', compare.TITLES[quantity],
+                                           baseline.x, baseline.output[row],
+                                           comparison.values(quantity), comparison.names,
+                                           baseline.brg_x, brg_y)))
+    return jobs
+
+def create_overlay_plots(fileprefix, comparison, workers=None):
+    # Overlay plots of compared runs to fileprefix + quantity + .png
+    return render_plots(overlay_plot_jobs(fileprefix, comparison), workers)
+
+def output_plot_jobs(fileprefix, output, brgs):
+    # (function, arguments) for each output plot
+    # Transpose lists for plotting
+    data = list(zip(*output))
+    brgs_zip = list(zip(*brgs))
+
+    # Bearing offsets for deflection plot
+    offsets = brgs_zip[3]
+
+    jobs = []
+    for j in range(len(PLOT_FILES)):
+        jobs.append((render_output_plot, (fileprefix + PLOT_FILES[j] + '.png', j, data[1], data[2+j],
+                                          brgs_zip[1], offsets)))
+
+        # show bearings at zero after 1st plot (deflection)
+        offsets = [0 for x in brgs_zip[4]]
+    return jobs
+
+def model_plot_job(filename, model, output, brgs, conc_masses):
+    # (function, arguments) for model plot
+    # bearing or mass at last node uses last element diameter
+    last = len(model) - 1
+    masses = [mass for mass in conc_masses if mass[2] > 0]
+    return (render_model_plot, (filename, [node[1] for node in output], [elem[1] for elem in model],
+                                [brg[1] for brg in brgs],
+                                [model[min(brg[0]-1, last)][1] for brg in brgs],
+                                [output[mass[0]-1][1] for mass in masses],
+                                [model[min(mass[0]-1, last)][1] for mass in masses]))
+
+def render_plots(jobs, workers=None):
+    # Run plot jobs across workers processes, or in turn if workers is 1
+    # Default one process per job up to the number of CPUs, so with a single CPU plots are
+    # rendered in turn (a pool there only adds each worker's matplotlib import, about 0.5 s)
+    # Returns plot file : (wall, cpu) render time (s)
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return dict(func(*args) for func, args in jobs)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, *args) for func, args in jobs]
+        return dict(future.result() for future in futures)
+
+def create_output_plots(fileprefix, output, brgs, workers=1):
+    # Plot each output quantity to fileprefix + name + .png
+    return render_plots(output_plot_jobs(fileprefix, output, brgs), workers)
+
+def create_model_plot(filename, model, output, brgs, conc_masses):
+    # Plot model to image file
+    return render_plots([model_plot_job(filename, model, output, brgs, conc_masses)])
+
+def create_plots(fileprefix, model, output, brgs, conc_masses, workers=None, only=None):
+    # All output plots and model plot, across workers processes (default one per CPU)
+    # only : names of plots to make (from PLOT_FILES and 'model'), default all
+    jobs = output_plot_jobs(fileprefix + 'output-', output, brgs)
+    jobs.append(model_plot_job(fileprefix + 'model.png', model, output, brgs, conc_masses))
+    if only is not None:
+        jobs = [job for job, name in zip(jobs, PLOT_FILES + ['model']) if name in only]
+    return render_plots(jobs, workers)
@@ -0,0 +1,282 @@
+# Local HTTP service for parsed SHAFT.OUT results
+# Parsed results are kept in memory (least recently used dropped past capacity) and
+# reparsed when the file's size or modified time changes, so repeated requests for
+# the same run cost no parsing. Requests are handled in threads, standard library only.
+#
+# GET endpoints, file=<path relative to root> (default SHAFT.OUT or shaft_out_location),
+# case=<load case from 1>
+#   /files                      cached files
+#   /summary                    model summary
+#   /output                     node, x and output quantities at each node
+#   /bearings                   bearing names, nodes, positions, reactions and L/D
+#   /influence                  influence coefficients (kN/mm)
+#   /errors                     parse errors of file
+#   /plots/<name>.png           output plot (defl, slope, shear, moment, stress) or model
+# Run: ShaftkitParser --serve 8050
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from fields import QUANTITIES
+from shaftout import ParseError, ParseErrors
+
+
+class ServiceError(Exception):
+    # Request that can't be answered, status is the HTTP status code
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def file_stamp(filename):
+    # (size, modified time) of file, raises OSError if missing
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Entry:
+    # Parsed results of one file and the plots rendered from them
+    # results is None and error is the ParseError if results could not be read
+
+    def __init__(self, stamp, results, errors, error=None):
+        self.stamp = stamp
+        self.results = results
+        self.errors = errors
+        self.error = error
+        self.plots = dict()
+
+
+class ResultsCache:
+    # Parsed results of up to capacity files, in least recently used order
+    # load : function(filename, errors=ParseErrors) returning ShaftResults (parser.read_results)
+
+    def __init__(self, load, capacity=8):
+        self.load = load
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # one lock per file, so a file is parsed once when requested by several clients at once
+        self.file_locks = dict()
+
+    def _file_lock(self, filename):
+        with self.lock:
+            return self.file_locks.setdefault(filename, threading.Lock())
+
+    def get(self, filename):
+        # Entry of file, parsed again if file changed since it was loaded
+        # Raises OSError if file can't be read, a file that can't be parsed gives an entry
+        # without results (its parse errors are kept)
+        with self._file_lock(filename):
+            stamp = file_stamp(filename)
+            with self.lock:
+                entry = self.entries.get(filename)
+                if entry is not None and entry.stamp == stamp:
+                    self.entries.move_to_end(filename)
+                    return entry
+
+            errors = ParseErrors()
+            try:
+                entry = Entry(stamp, self.load(filename, errors=errors), errors)
+            except ParseError as e:
+                entry = Entry(stamp, None, errors, e)
+            with self.lock:
+                self.entries[filename] = entry
+                self.entries.move_to_end(filename)
+                while len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+            return entry
+
+    def files(self):
+        # [file, size, modified time] of cached files, most recently used last
+        with self.lock:
+            return [[filename, *entry.stamp] for filename, entry in self.entries.items()]
+
+
+def _values(array):
+    # Array as nested lists for JSON, nan (bad values in file) as null
+    array = np.asarray(array, dtype=float)
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+# Plots rendered at once (plot figures are shared in the process)
+plot_lock = threading.Lock()
+
+
+def render_plot(results, name):
+    # PNG bytes of one output plot or model plot of ShaftResults
+    # plotting libraries are loaded on first plot request
+    import plots
+    model, output, brgs, _, _, conc_masses = results.as_lists()
+    if name == 'model':
+        func, args = plots.model_plot_job('', model, output, brgs, conc_masses)
+    elif name in plots.PLOT_FILES:
+        func, args = plots.output_plot_jobs('', output, brgs)[plots.PLOT_FILES.index(name)]
+    else:
+        raise ServiceError(404, f'no plot {name}')
+
+    buffer = BytesIO()
+    with plot_lock:
+        func(buffer, *args[1:])
+    return buffer.getvalue()
+
+
+class Service:
+    # Answers requests from results of files below root directory
+    # default_file : file when request has no file parameter (relative to root or absolute),
+    #                served even if outside root (eg. shaft_out_location setting)
+
+    def __init__(self, cache, root='.', default_file='SHAFT.OUT'):
+        self.cache = cache
+        self.root = os.path.realpath(root)
+        self.default_file = os.path.realpath(os.path.join(self.root, default_file))
+        self.routes = dict({'/files' : self.files, '/summary' : self.summary,
+                            '/output' : self.output, '/bearings' : self.bearings,
+                            '/influence' : self.influence, '/errors' : self.errors})
+
+    def inside(self, path):
+        # True if path is below root
+        try:
+            return os.path.commonpath([self.root, path]) == self.root
+        except ValueError:
+            # different drive
+            return False
+
+    def path(self, query):
+        # Full path of requested file, only files below root and default file are served
+        if 'file' not in query:
+            return self.default_file
+        filename = query['file'][0]
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if not self.inside(path) and path != self.default_file:
+            raise ServiceError(403, f'{filename} is outside served folder')
+        return path
+
+    def entry(self, query):
+        try:
+            return self.cache.get(self.path(query))
+        except OSError as e:
+            raise ServiceError(404, str(e))
+
+    def results(self, query):
+        # ShaftResults of requested file and load case
+        entry = self.entry(query)
+        if entry.results is None:
+            # results could not be assembled
+            raise ServiceError(422, str(entry.error))
+        results = entry.results
+        try:
+            case = int(query.get('case', ['1'])[0]) - 1
+        except ValueError:
+            raise ServiceError(400, 'case must be a number')
+        if not 0 <= case < results.n_cases:
+            raise ServiceError(404, f'no load case {case + 1}, file has {results.n_cases}')
+        return results if results.n_cases == 1 else results.case(case)
+
+    def files(self, query):
+        return dict({'files' : [dict({'file' : os.path.relpath(filename, self.root)
+                                      if self.inside(filename) else filename,
+                                      'size' : size, 'mtime' : mtime})
+                                for filename, size, mtime in self.cache.files()]})
+
+    def summary(self, query):
+        results = self.results(query)
+        return dict({'summary' : dict(results.summary), 'n_cases' : self.entry(query).results.n_cases,
+                     'n_nodes' : results.model.n_nodes, 'n_elements' : results.model.n_elements})
+
+    def output(self, query):
+        results = self.results(query)
+        values = dict({'node' : results.node.tolist(), 'x' : _values(results.x)})
+        values.update({name: _values(row) for name, row in zip(QUANTITIES, results.output)})
+        return values
+
+    def bearings(self, query):
+        results = self.results(query)
+        return dict({'name' : results.brg_names, 'node' : results.brg_node.tolist(),
+                     'x' : _values(results.brg_x), 'straight' : _values(results.straight),
+                     'offset' : _values(results.offset), 'reaction' : _values(results.reaction),
+                     'ld' : [None if ratio == '' or ratio != ratio else ratio
+                             for ratio in results.span_ratios]})
+
+    def influence(self, query):
+        results = self.results(query)
+        return dict({'bearings' : results.brg_names, 'influence' : _values(results.influence)})
+
+    def errors(self, query):
+        entry = self.entry(query)
+        errors = entry.errors
+        return dict({'count' : len(errors), 'counts' : errors.counts, 'records' : errors.records,
+                     'error' : None if entry.error is None else str(entry.error)})
+
+    def plot(self, name, query):
+        # PNG of plot, rendered once per file version and load case
+        entry = self.entry(query)
+        results = self.results(query)
+        key = (name, query.get('case', ['1'])[0])
+        if key not in entry.plots:
+            entry.plots[key] = render_plot(results, name)
+        return entry.plots[key]
+
+    def handle(self, url):
+        # (content type, body bytes) of request url
+        # Raises ServiceError
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        if parts.path.startswith('/plots/') and parts.path.endswith('.png'):
+            return 'image/png', self.plot(parts.path[len('/plots/'):-len('.png')], query)
+        route = self.routes.get(parts.path.rstrip('/'))
+        if route is None:
+            raise ServiceError(404, f'no endpoint {parts.path}')
+        return 'application/json', json.dumps(route(query)).encode()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # HTTP request handler, service is set on the server
+
+    def do_GET(self):
+        try:
+            content_type, body = self.server.service.handle(self.path)
+            status = 200
+        except ServiceError as e:
+            status = e.status
+            content_type, body = 'application/json', json.dumps(dict({'error' : str(e)})).encode()
+        except Exception as e:
+            # unexpected failure (eg. reading file), answered so the client isn't left waiting
+            status = 500
+            content_type = 'application/json'
+            body = json.dumps(dict({'error' : f'{type(e).__name__}: {e}'})).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(service, host='127.0.0.1', port=8050, verbose=False):
+    # Threaded HTTP server for service (port 0 picks a free port), not started
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def serve(service, host='127.0.0.1', port=8050, verbose=False):
+    # Answer requests until Ctrl+C
+    server = create_server(service, host, port, verbose)
+    print(f'Serving results of {service.root} on http://{host}:{server.server_address[1]}, Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopped serving')
+    finally:
+        server.server_close()
@@ -0,0 +1,110 @@
+# Binary export of parsed Shaftkit results, read back with memory mapping
+#
+# File layout (little endian):
+#   8 bytes     magic b'SHAFTBIN'
+#   uint32      format version
+#   uint32      header length in bytes
+#   header      UTF-8 JSON:
+#               {"arrays": {name: {"dtype": "<f8", "shape": [...], "offset": bytes from file start}},
+#                "summary": {...}, "brg_names": [...], "span_ratios": [...]}
+#   arrays      raw C order array data, each starting on a 64 byte boundary
+#
+# Arrays match ShaftModel / ShaftResults attributes:
+#   node, x, elements (9 x elements), conc_masses_node/_dof/_value (and springs, damps),
+#   output (cases x 5 x nodes), brg_node, bearings (cases x 3 x bearings), straight_reactions,
+#   influence (version 1 files have output and bearings of a single case, without cases axis),
+#   end_forces (cases x 4 x elements, only if known)
+
+import json
+import struct
+import numpy as np
+from shaftmodel import Concentrated, ShaftModel, ShaftResults
+
+MAGIC = b'SHAFTBIN'
+VERSION = 2
+ALIGN = 64
+PREAMBLE = struct.Struct('<8sII')
+CONCENTRATED = ('conc_masses', 'conc_springs', 'conc_damps')
+
+
+def _arrays(results):
+    # name : array for all arrays in results
+    model = results.model
+    arrays = dict({'node' : model.node, 'x' : model.x, 'elements' : model.elements})
+    for name in CONCENTRATED:
+        conc = getattr(model, name)
+        arrays[name + '_node'] = conc.node
+        arrays[name + '_dof'] = conc.dof
+        arrays[name + '_value'] = conc.value
+    arrays.update({'output' : results.case_output, 'brg_node' : results.brg_node,
+                   'bearings' : results.case_bearings,
+                   'straight_reactions' : results.straight_reactions,
+                   'influence' : results.influence})
+    if results.case_end_forces is not None:
+        arrays['end_forces'] = results.case_end_forces
+    return {name: np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+            for name, array in arrays.items()}
+
+
+def write_results(filename, results):
+    # Write ShaftResults to binary file
+    arrays = _arrays(results)
+
+    # span ratio is blank for last bearing
+    ratios = [None if ratio == '' else float(ratio) for ratio in results.span_ratios]
+    header = dict({'arrays' : {}, 'summary' : results.summary,
+                   'brg_names' : results.brg_names, 'span_ratios' : ratios})
+
+    # header size depends on offsets, so place arrays after a padded header estimate
+    index = {name: {'dtype' : array.dtype.str, 'shape' : list(array.shape), 'offset' : 0}
+             for name, array in arrays.items()}
+    header['arrays'] = index
+    size = len(json.dumps(header).encode()) + 32 * len(arrays)
+    offset = PREAMBLE.size + size
+    for name, array in arrays.items():
+        offset += -offset % ALIGN
+        index[name]['offset'] = offset
+        offset += array.nbytes
+
+    text = json.dumps(header).encode().ljust(size)
+    with open(filename, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, VERSION, len(text)))
+        file.write(text)
+        for name, array in arrays.items():
+            file.seek(index[name]['offset'])
+            file.write(array.tobytes())
+
+
+def read_header(filename):
+    # Header dict of binary file, without reading any arrays
+    with open(filename, 'rb') as file:
+        magic, version, size = PREAMBLE.unpack(file.read(PREAMBLE.size))
+        if magic != MAGIC or version > VERSION:
+            raise ValueError(f'{filename} is not a shaft results file (version {VERSION} or lower)')
+        return json.loads(file.read(size))
+
+
+def read_arrays(filename):
+    # name : read only array memory mapped from binary file
+    header = read_header(filename)
+    raw = np.memmap(filename, dtype=np.uint8, mode='r')
+    arrays = dict()
+    for name, item in header['arrays'].items():
+        dtype = np.dtype(item['dtype'])
+        count = int(np.prod(item['shape'], dtype=np.int64))
+        start = item['offset']
+        arrays[name] = raw[start:start + count * dtype.itemsize].view(dtype).reshape(item['shape'])
+    return header, arrays
+
+
+def read_results(filename):
+    # ShaftResults from binary file, arrays are memory mapped (not read until used)
+    header, arrays = read_arrays(filename)
+    conc = [Concentrated(arrays[name + '_node'], arrays[name + '_dof'], arrays[name + '_value'])
+            for name in CONCENTRATED]
+    model = ShaftModel(arrays['node'], arrays['x'], arrays['elements'], *conc)
+
+    ratios = ['' if ratio is None else ratio for ratio in header['span_ratios']]
+    return ShaftResults(model, arrays['output'], arrays['brg_node'], arrays['bearings'],
+                        header['brg_names'], ratios, arrays['straight_reactions'],
+                        arrays['influence'], header['summary'], arrays.get('end_forces'))
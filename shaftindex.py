@@ -0,0 +1,233 @@
+# Random access index of SHAFT.OUT sections
+# One byte level scan finds the section headers shaftout.parse_sections recognises
+# and records, per section, byte offsets, row count and the offset of every
+# INDEX_STEP'th row. The index is kept in a sidecar file (<file>.idx) next to the
+# output file, so single sections or a node range of DISPLACEMENTS / BEAM FORCES
+# can be read without parsing the rest of the file.
+# Run: python shaftindex.py SHAFT.OUT --section inf --nodes 100:200
+
+import argparse
+import io
+import json
+import mmap
+import os
+import re
+import numpy as np
+from cache import _replace
+from shaftout import CASE_KEYS, HEADER_KEYS, SECTION_HANDLERS, ParseErrors, Rows, find_headers
+
+# Change when index layout changes, so old sidecar files are rebuilt
+INDEX_VERSION = 1
+
+# Rows between stored row offsets
+INDEX_STEP = 1024
+
+# Section key : header line
+KEY_HEADERS = {key: header for header, key in HEADER_KEYS.items()}
+
+# Header lines before first row of sections not read by parse_table
+HANDLER_SKIP = dict({'brg_reacts' : 4, 'inf' : 2})
+
+# Section key : (rows per node, node column) for node range queries
+NODE_ROWS = dict({'disps' : (1, 0), 'beam_forces' : (2, 1)})
+
+
+def _handler(key):
+    return SECTION_HANDLERS[KEY_HEADERS[key]]
+
+
+def _end_pattern(line):
+    # Pattern of a line with first tab separated field equal to line
+    return re.compile(b'^' + re.escape(line.encode()) + b'(?:\t[^\n]*)?\r?$', re.MULTILINE)
+
+
+def _line_ends(data, start, end):
+    # Byte offsets of each b'\n' in data[start:end]
+    view = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+    try:
+        return np.flatnonzero(view == 10) + start
+    finally:
+        del view
+
+
+def _index_section(data, key, start, end):
+    # Index entry of one section, header line at start, next header (or end of file) at end
+    handler = _handler(key)
+    table = getattr(handler, 'keywords', None)
+    skip = table['skip'] if table else HANDLER_SKIP[key]
+
+    ends = _line_ends(data, start, end)
+    # first row starts after header line and skip lines
+    first = int(ends[skip]) + 1 if len(ends) > skip else end
+    starts = np.concatenate(([first], ends[skip+1:] + 1))
+    starts = starts[starts < end]
+
+    if table:
+        # rows end at the table's end line, which may not be a section header (ELEMEN DEF)
+        stop = _end_pattern(table['end']).search(data, first, end)
+        rows = int(np.searchsorted(starts, stop.start())) if stop else len(starts)
+    else:
+        # rows end at first blank line (influence) or after one row (bearing reactions)
+        rows = 0
+        for offset in starts:
+            if key == 'brg_reacts' and rows == 1:
+                break
+            if data[offset:offset + 1] in (b'\n', b'\r', b'\t'):
+                break
+            rows += 1
+    return dict({'key' : key, 'start' : start, 'end' : end, 'rows' : rows,
+                 'row_offsets' : starts[:rows:INDEX_STEP].tolist()})
+
+
+def build_index(filename):
+    # Index dict of file: size, mtime and list of section entries in file order
+    stat = os.stat(filename)
+    index = dict({'version' : INDEX_VERSION, 'size' : stat.st_size, 'mtime' : stat.st_mtime_ns,
+                  'step' : INDEX_STEP, 'sections' : []})
+    if stat.st_size == 0:
+        return index
+
+    with open(filename, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            headers = find_headers(data)
+            ends = [start for _, start in headers[1:]] + [len(data)]
+            index['sections'] = [_index_section(data, key, start, end)
+                                 for (key, start), end in zip(headers, ends)]
+    return index
+
+
+def index_filename(filename):
+    return filename + '.idx'
+
+
+def load_index(filename, save=True):
+    # Index of file from sidecar file, rebuilt (and saved if save) when missing or out of date
+    stat = os.stat(filename)
+    try:
+        with open(index_filename(filename)) as file:
+            index = json.load(file)
+        if (index['version'] == INDEX_VERSION and index['size'] == stat.st_size
+                and index['mtime'] == stat.st_mtime_ns):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = build_index(filename)
+    if save:
+        def write(temp):
+            with open(temp, 'w') as file:
+                json.dump(index, file)
+        try:
+            _replace(index_filename(filename), write)
+        except OSError:
+            # read only folder, index is only kept in memory
+            pass
+    return index
+
+
+class SectionIndex:
+    # Indexed SHAFT.OUT, reads sections or row ranges by seeking to their offsets
+    # case : load case of result sections (shaftout.CASE_KEYS), nth occurrence in file
+
+    def __init__(self, filename, save=True):
+        self.filename = filename
+        self.index = load_index(filename, save)
+        self.entries = dict()
+        for entry in self.index['sections']:
+            self.entries.setdefault(entry['key'], []).append(entry)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    @property
+    def n_cases(self):
+        return max([len(self.entries.get(key, [])) for key in CASE_KEYS] + [1])
+
+    def entry(self, key, case=0):
+        # Index entry of section, None if not in file
+        entries = self.entries.get(key, [])
+        return entries[case] if case < len(entries) else None
+
+    def rows(self, key, case=0):
+        # Number of rows in section
+        return self.entry(key, case)['rows']
+
+    def _read(self, start, end):
+        # Text of file bytes start:end, NUL characters removed (as shaftout.read_lines)
+        with open(self.filename, 'rb') as file:
+            file.seek(start)
+            text = file.read(end - start).decode('ascii', errors='replace')
+        return text.replace('\r\n', '\n').replace('\0', '')
+
+    def section(self, key, case=0, errors=None):
+        # Parsed rows of one section, same as parse_sections(filename)['cases'][case][key]
+        # errors : ParseErrors bad lines are added to (line numbers within the section)
+        entry = self.entry(key, case)
+        if entry is None:
+            return []
+
+        sections = {key: []}
+        rows = Rows(io.StringIO(self._read(entry['start'], entry['end'])))
+        next(rows)
+        try:
+            _handler(key)(rows, sections, ParseErrors() if errors is None else errors)
+        except StopIteration:
+            # section runs to end of read text
+            pass
+        return sections[key]
+
+    def sections(self, keys, case=0):
+        # Section key : parsed rows for each of keys
+        return {key: self.section(key, case) for key in keys}
+
+    def read_rows(self, key, start, stop, case=0):
+        # Parsed rows start:stop (row numbers from 0) of a table section
+        entry = self.entry(key, case)
+        if entry is None:
+            return []
+        types = _handler(key).keywords['types']
+        start = max(start, 0)
+        stop = min(stop, entry['rows'])
+        if start >= stop:
+            return []
+
+        # seek to stored row offset at or before start, then skip the remaining rows
+        step = self.index['step']
+        offsets = entry['row_offsets']
+        begin = offsets[start // step]
+        k = (stop - 1) // step + 1
+        end = offsets[k] if k < len(offsets) else entry['end']
+
+        lines = self._read(begin, end).split('\n')[start % step:start % step + stop - start]
+        return [[f(v) for f, v in zip(types, line.partition('\t')[0].split())] for line in lines]
+
+    def node_rows(self, key, first, last, case=0):
+        # Parsed rows of DISPLACEMENTS or BEAM FORCES for nodes first to last (inclusive)
+        # Rows are assumed in node order, only rows with node in range are returned
+        per_node, column = NODE_ROWS[key]
+        start = per_node * (first - 1) - (per_node - 1)
+        stop = per_node * last
+        return [row for row in self.read_rows(key, start, stop, case) if first <= row[column] <= last]
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description='Index SHAFT.OUT sections and read one section')
+    cli.add_argument('filename', nargs='?', default='SHAFT.OUT')
+    cli.add_argument('--section', choices=sorted(KEY_HEADERS), help='print rows of section')
+    cli.add_argument('--nodes', metavar='FIRST:LAST', help='only nodes FIRST to LAST of disps or beam_forces')
+    cli.add_argument('--case', type=int, default=1, help='load case of result sections (from 1)')
+    args = cli.parse_args()
+
+    index = SectionIndex(args.filename)
+    for entry in index.index['sections']:
+        print(f"{entry['key']:14} {entry['rows']:10d} rows  bytes {entry['start']}-{entry['end']}")
+
+    if args.section and args.nodes:
+        first, last = (int(n) for n in args.nodes.split(':'))
+        rows = index.node_rows(args.section, first, last, args.case - 1)
+    elif args.section:
+        rows = index.section(args.section, args.case - 1)
+    else:
+        rows = []
+    for row in rows:
+        print(*row)
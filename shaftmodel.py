@@ -0,0 +1,297 @@
+# Array backed containers for parsed Shaftkit model and results
+# Each quantity is stored as a contiguous NumPy array, named properties return
+# views (no copies). as_lists() gives the original nested list layout.
+
+from math import pi
+import numpy as np
+import instrument
+from alignment import calc_reactions
+from spans import Spans
+
+
+def _row(block, index):
+    # Property returning one row of a 2D block array (contiguous view)
+    return property(lambda self: getattr(self, block)[index])
+
+
+class Concentrated:
+    # Concentrated mass, spring or damper values [node, dof, value]
+
+    def __init__(self, node, dof, value):
+        self.node = np.asarray(node, dtype=int)
+        self.dof = np.asarray(dof, dtype=int)
+        self.value = np.asarray(value, dtype=float)
+
+    @classmethod
+    def from_rows(cls, rows):
+        # from parsed rows [node, dof, value]
+        data = np.array(rows, dtype=float).reshape(-1, 3)
+        return cls(data[:, 0].astype(int), data[:, 1].astype(int),
+                   np.ascontiguousarray(data[:, 2]))
+
+    def __len__(self):
+        return len(self.node)
+
+    def as_lists(self):
+        return [[n, d, v] for n, d, v in zip(self.node.tolist(), self.dof.tolist(),
+                                             self.value.tolist())]
+
+
+class ShaftModel:
+    # Shaft model definition
+    # node, x : node number and position (m)
+    # elements block rows : OD (m), ID (m), E (MPa), G (MPa), rho (kg/m^3),
+    #                       length (m), mass (kg), section modulus (m^3), mom. inertia (m^4)
+
+    ELEMENT_COLUMNS = ('od', 'id', 'e', 'g', 'rho', 'length', 'mass', 'secmod', 'inertia')
+
+    def __init__(self, node, x, elements, conc_masses, conc_springs, conc_damps):
+        self.node = np.asarray(node, dtype=int)
+        self.x = np.asarray(x, dtype=float)
+        self.elements = np.ascontiguousarray(elements, dtype=float)
+        self.conc_masses = conc_masses
+        self.conc_springs = conc_springs
+        self.conc_damps = conc_damps
+
+    od = _row('elements', 0)
+    id = _row('elements', 1)
+    e = _row('elements', 2)
+    g = _row('elements', 3)
+    rho = _row('elements', 4)
+    length = _row('elements', 5)
+    mass = _row('elements', 6)
+    secmod = _row('elements', 7)
+    inertia = _row('elements', 8)
+
+    @property
+    def n_nodes(self):
+        return len(self.node)
+
+    @property
+    def n_elements(self):
+        return self.elements.shape[1]
+
+    @property
+    def element(self):
+        # element numbers, sequential from 1
+        return np.arange(1, self.n_elements + 1)
+
+    def as_lists(self):
+        # [element num, OD, ID, E, G, rho, length, mass, section modulus, mom. inertia]
+        return [[i, *row] for i, row in zip(self.element.tolist(), self.elements.T.tolist())]
+
+
+class ShaftResults:
+    # Parsed and calculated results for one SHAFT.OUT
+    # output block rows : disp (mm), slope (mrad), shear (kN), bm (kNm), bs (MPa) at each node
+    # bearings block rows : straight reactions (kN), calc offsets (mm), calc reactions (kN)
+    # influence : bearing influence matrix (kN/mm), straight_reactions (kN)
+    # case_output, case_bearings : output and bearings blocks of each load case stacked,
+    #                              shape (cases, rows, nodes / bearings), output and
+    #                              bearings are views of the first case
+    # case_end_forces : shear left, shear right (kN), moment left, moment right (kNm) at
+    #                   ends of each element, shape (cases, 4, elements), None if not known
+
+    OUTPUT_COLUMNS = ('disp', 'slope', 'shear', 'moment', 'stress')
+    BEARING_COLUMNS = ('straight', 'offset', 'reaction')
+
+    def __init__(self, model, output, brg_node, bearings, brg_names, span_ratios,
+                 straight_reactions, influence, summary, end_forces=None):
+        # output and bearings are one load case (2D) or stacked load cases (3D)
+        self.model = model
+        self.brg_node = np.asarray(brg_node, dtype=int)
+        self.case_output = np.ascontiguousarray(output, dtype=float).reshape(-1, 5, len(model.node))
+        self.case_bearings = np.ascontiguousarray(bearings, dtype=float).reshape(-1, 3, len(self.brg_node))
+        self.output = self.case_output[0]
+        self.bearings = self.case_bearings[0]
+        self.case_end_forces = None
+        if end_forces is not None:
+            self.case_end_forces = np.ascontiguousarray(end_forces, dtype=float).reshape(
+                -1, 4, model.n_elements)
+        self.brg_names = list(brg_names)
+        self.span_ratios = list(span_ratios)
+        self.straight_reactions = np.asarray(straight_reactions, dtype=float)
+        self.influence = np.asarray(influence, dtype=float)
+        self.summary = summary
+
+    disp = _row('output', 0)
+    slope = _row('output', 1)
+    shear = _row('output', 2)
+    moment = _row('output', 3)
+    stress = _row('output', 4)
+
+    straight = _row('bearings', 0)
+    offset = _row('bearings', 1)
+    reaction = _row('bearings', 2)
+
+    @property
+    def n_cases(self):
+        return len(self.case_output)
+
+    @property
+    def node(self):
+        return self.model.node
+
+    @property
+    def x(self):
+        return self.model.x
+
+    @property
+    def brg_x(self):
+        # bearing positions (m)
+        return self.model.x[self.brg_node - 1]
+
+    def span_metrics(self):
+        # Length, diameter, L/D and mass of spans between consecutive bearings (see spans.Spans)
+        return Spans.from_model(self.model).consecutive(self.brg_node)
+
+    def case(self, k):
+        # ShaftResults of load case k, sharing model and influence arrays
+        end_forces = None if self.case_end_forces is None else self.case_end_forces[k]
+        return ShaftResults(self.model, self.case_output[k], self.brg_node, self.case_bearings[k],
+                            self.brg_names, self.span_ratios, self.straight_reactions,
+                            self.influence, self.summary, end_forces)
+
+    def envelope(self):
+        # Max and min of each output quantity at each node across load cases
+        # Returns (max, min) arrays, same layout as output block
+        return self.case_output.max(axis=0), self.case_output.min(axis=0)
+
+    def envelope_lists(self):
+        # [node num, x (m), max disp (mm), min disp (mm), max bm (kNm), min bm (kNm),
+        #  max bs (MPa), min bs (MPa)]
+        high, low = self.envelope()
+        rows = np.vstack([(high[j], low[j]) for j in (0, 3, 4)])
+        return [[n, x, *row] for n, x, row in zip(self.node.tolist(), self.x.tolist(),
+                                                  rows.T.tolist())]
+
+    def output_lists(self):
+        # [node num, x (m), disp (mm), slope (mrad), shear (kN), bm (kNm), bs (MPa)]
+        return [[n, x, *row] for n, x, row in zip(self.node.tolist(), self.x.tolist(),
+                                                  self.output.T.tolist())]
+
+    def bearing_lists(self):
+        # [node, x (m), straight reaction (kN), offset (mm), reaction (kN), name, l/d ratio]
+        return [[n, x, *row, name, ratio]
+                for n, x, row, name, ratio in zip(self.brg_node.tolist(), self.brg_x.tolist(),
+                                                  self.bearings.T.tolist(), self.brg_names,
+                                                  self.span_ratios)]
+
+    def as_lists(self):
+        # Same layout as original read_data return values
+        # model, output, brgs, inf, summary, conc_masses
+        return (self.model.as_lists(), self.output_lists(), self.bearing_lists(),
+                self.influence.tolist(), dict(self.summary),
+                self.model.conc_masses.as_lists())
+
+
+def _table(rows, columns):
+    # Parsed section rows (list or array) as 2D float array, shape (len(rows), columns)
+    return np.asarray(rows, dtype=float).reshape(-1, columns)
+
+
+def _case_tables(sections):
+    # Displacements and beam forces of each load case stacked,
+    # shapes (cases, nodes, 3) and (cases, 2 * elements, 4)
+    # Load cases with a different number of rows than the first are left out
+    cases = sections.get('cases') or [sections]
+    disps = [_table(case['disps'], 3) for case in cases]
+    beam_forces = [_table(case['beam_forces'], 4) for case in cases]
+    keep = [k for k in range(len(cases))
+            if disps[k].shape == disps[0].shape and beam_forces[k].shape == beam_forces[0].shape]
+    if len(keep) < len(cases):
+        print(f'NOTE: {len(cases) - len(keep)} load case(s) with incomplete results are not used.')
+    return np.stack([disps[k] for k in keep]), np.stack([beam_forces[k] for k in keep])
+
+
+def assemble(sections, brg_names):
+    # Build ShaftResults from parsed SHAFT.OUT sections (see shaftout.parse_sections)
+    # All per element and per node values are calculated as array expressions,
+    # output and bearings of all load cases in one pass
+
+    with instrument.stage('assemble model'):
+        nodes = _table(sections['nodes'], 2)
+        elements = _table(sections['elements'], 5)
+        disps, beam_forces = _case_tables(sections)
+        conc_masses = Concentrated.from_rows(sections['conc_masses'])
+        conc_springs = Concentrated.from_rows(sections['conc_springs'])
+
+        ############################################################
+        # Assemble model [OD (m), ID (m), E (MPa), G (MPa), rho(kg/m^3),
+        #                 length (m), mass (kg), section modulus (m^3), mom. inertia (m^4)]
+        od, bore, _, _, rho = elements.T
+        x = nodes[:, 1].copy()
+        n_elems = len(od)
+
+        length = x[1:n_elems+1] - x[:n_elems]
+        mass = (od**2 - bore**2) * pi / 4 * rho * length
+        inertia = pi / 64 * (od**4 - bore**4)
+        secmod = inertia / (od / 2)
+
+        model = ShaftModel(nodes[:, 0].astype(int), x,
+                           np.vstack((elements.T, length, mass, secmod, inertia)),
+                           conc_masses, conc_springs, Concentrated.from_rows(sections['conc_damps']))
+
+    with instrument.stage('assemble output'):
+        ############################################################
+        # Assemble output [disp (mm), slope (mrad), shear (kN), bm (kNm), bs (MPa)]
+        # all values left side of element except last value (and bending moment in shaftkit is right side)
+        # beam forces has left and right end row for each element
+        # disps and beam forces are stacked load cases, output shape (cases, 5, nodes)
+        n_nodes = len(x)
+        i = np.arange(n_nodes)
+
+        # shear from left end of element i, moment from right end of element i-1
+        shear_row = 2 * i
+        moment_row = 2 * i - 1
+        moment_row[0] = 0
+        shear_row[-1] = moment_row[-1] = beam_forces.shape[1] - 1
+
+        # element for section properties, last node uses last element
+        elem = np.minimum(i, n_elems - 1)
+
+        moment = beam_forces[:, moment_row, 3]
+        output = np.stack((disps[..., 1] * 1000, disps[..., 2] * 1000,
+                           beam_forces[:, shear_row, 2] / 1000, moment / 1000,
+                           moment / 1000 * od[elem] / 2 / inertia[elem] / 1000), axis=1)
+
+        # element end shear and moment (kN, kNm), rows are left then right end of each element
+        end_forces = None
+        if beam_forces.shape[1] == 2 * n_elems:
+            end_forces = np.stack((beam_forces[:, 0::2, 2], beam_forces[:, 1::2, 2],
+                                   beam_forces[:, 0::2, 3], beam_forces[:, 1::2, 3]), axis=1) / 1000
+
+        #############################################################
+        # Tabulate Sums
+        # Sum of Element Masses (kg), Concentrated Masses (kg), Total Model (kg) / (kN)
+        tmass_elems = float(mass.sum())
+        tmass_conc = float(conc_masses.value.sum())
+        tmass = tmass_elems + tmass_conc
+        tweight = tmass * 9.81/1000
+        summary = dict({'Total Number of Elements' : n_elems,
+                        'Total Length' : float(x[-1]), 'Total Element Mass (kg)' : tmass_elems,
+                        'Total Concentrated Mass (kg)' : tmass_conc, 'Total Mass (kg)' : tmass,
+                        'Total Weight (kN)' : tweight})
+
+    with instrument.stage('bearings'):
+        #############################################################
+        # Clean up influence
+        inf = _table(sections['inf'], len(conc_springs))
+        straight_reactions = inf[0]
+        inf = inf[1:]
+
+        #############################################################
+        # Bearing details, offsets and reactions values
+        brg_node = conc_springs.node
+        # offsets and reactions of each load case, shape (cases, bearings)
+        calc_offsets = output[:, 0, brg_node - 1]
+        reactions = calc_reactions(straight_reactions, inf, calc_offsets)
+
+        # l/d ratio w/ next bearing, blank for last bearing
+        spans = Spans(x, length, od, mass).consecutive(brg_node)
+        ratios = spans['ld'].tolist() + ([""] if len(brg_node) else [])
+
+    straight = np.broadcast_to(straight_reactions, calc_offsets.shape)
+    return ShaftResults(model, output, brg_node,
+                        np.stack((straight, calc_offsets, reactions), axis=1),
+                        brg_names, ratios, straight_reactions, inf, summary, end_forces)
@@ -0,0 +1,345 @@
+# Streaming reader for Shaftkit MSA SHAFT.OUT file
+# Reads the file in chunks and hands each section to its own handler, so
+# memory is bounded by the largest section instead of the whole file
+
+import hashlib
+import mmap
+import re
+from functools import partial
+from math import nan
+import numpy as np
+import instrument
+
+# Characters read from file per chunk
+CHUNK_SIZE = 1 << 20
+
+# Change when parsed values change, so cached results are not reused
+PARSER_VERSION = 3
+
+
+def read_lines(file, chunk_size=CHUNK_SIZE):
+    # Generate lines from an open text file, read in chunks with NUL characters removed
+    tail = ''
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk.replace('\0', '')).split('\n')
+
+        # last piece may be a partial line, keep for next chunk
+        tail = lines.pop()
+        yield from lines
+
+    if tail:
+        yield tail
+
+
+class Rows:
+    # Iterator over first tab separated field of each line (same as csv row[0])
+    # An empty line gives ''. Keeps track of current line number for messages.
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.lines = read_lines(file, chunk_size)
+        self.lineno = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.lines)
+        self.lineno += 1
+        return line.partition('\t')[0]
+
+
+##############################################
+# Parse errors
+# Bad lines are collected as records instead of printed, in strict mode the first
+# one raises ParseError
+
+class ParseError(ValueError):
+    # Bad line or section in SHAFT.OUT, record is dict of section, line, text, reason
+
+    def __init__(self, record):
+        line = '' if record['line'] is None else f"line {record['line']} "
+        text = f": {record['text']!r}" if record['text'] else ''
+        super().__init__(f"{record['section']} {line}{record['reason']}{text}")
+        self.record = record
+
+    def __reduce__(self):
+        # pickled by record, so errors raised in worker processes can be sent back
+        return type(self), (self.record,)
+
+
+class ParseErrors:
+    # Parse errors of one file, first max_records records are kept and all are counted
+    # strict : raise ParseError on first error instead of collecting
+
+    def __init__(self, max_records=100, strict=False):
+        self.max_records = max_records
+        self.strict = strict
+        self.records = []
+        self.counts = dict()
+
+    def add(self, section, line, text, reason):
+        record = dict({'section' : section, 'line' : line, 'text' : text, 'reason' : reason})
+        if self.strict:
+            raise ParseError(record)
+        self.counts[section] = self.counts.get(section, 0) + 1
+        if len(self.records) < self.max_records:
+            self.records.append(record)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def summary(self, lines=5):
+        # Short report, count per section and first few records
+        if not self.counts:
+            return 'No parse errors'
+        text = [f'{len(self)} parse errors (' +
+                ', '.join(f'{section} {count}' for section, count in self.counts.items()) + ')']
+        for record in self.records[:lines]:
+            text.append('  ' + str(ParseError(record)))
+        if len(self) > lines:
+            text.append(f'  ... {len(self) - lines} more')
+        return '\n'.join(text)
+
+
+##############################################
+# Section handlers
+# Each handler is given the rows iterator positioned just after its header,
+# stores values in sections dict, adds bad lines to errors and returns the row
+# that ended the section (which may be the header of the next section)
+
+def _convert_row(x, types):
+    # Values of a bad row, missing or bad values are nan, and reason of first bad value
+    values = []
+    reason = ''
+    for k, f in enumerate(types):
+        try:
+            values.append(f(x[k]))
+        except IndexError:
+            values.append(nan)
+            reason = reason or f'expected {len(types)} values, found {len(x)}'
+        except ValueError as e:
+            values.append(nan)
+            reason = reason or str(e)
+    return values, reason
+
+
+def parse_table(rows, sections, errors, key, skip, end, types):
+    # Read whitespace separated rows until end header, converting each column
+    # Bad values are nan so following rows keep their position, blank lines are left out
+    table = sections[key]
+    for _ in range(skip):
+        next(rows)
+
+    row = next(rows)
+    while row != end:
+        x = row.split()
+        try:
+            if len(x) < len(types):
+                raise ValueError
+            table.append([f(v) for f, v in zip(types, x)])
+        except ValueError:
+            if x:
+                values, reason = _convert_row(x, types)
+                table.append(values)
+            else:
+                reason = 'blank line in table'
+            errors.add(key, rows.lineno, row, reason)
+        row = next(rows)
+    return row
+
+
+def parse_bearing_reactions(rows, sections, errors):
+    # Single row of reactions after the header lines
+    for _ in range(4):
+        next(rows)
+    row = next(rows)
+    x = row.split()
+    try:
+        sections['brg_reacts'].append([float(x[0]), float(x[1]), float(x[2])])
+    except (ValueError, IndexError) as e:
+        errors.add('brg_reacts', rows.lineno, row, str(e))
+    return row
+
+
+def decode_fixed_width(lines, width=10):
+    # Decode lines of fixed width numbers in bulk (values may have no whitespace between)
+    # Characters at start of line that don't fill a whole field are skipped, same as
+    # row[skip+i*width:skip+i*width+width] with skip = len(row) - width*num
+    # Returns list of 1D float arrays, one per line
+    # Raises ValueError if any field is not a number
+    groups = dict()
+    for k, line in enumerate(lines):
+        groups.setdefault(len(line) // width, []).append(k)
+
+    values = [None] * len(lines)
+    for num, index in groups.items():
+        # lines with same number of values are decoded as one block
+        text = ''.join([lines[k][len(lines[k]) - width*num:] for k in index])
+        block = np.frombuffer(text.encode('ascii'), dtype=f'S{width}').astype(float)
+        for k, row in zip(index, block.reshape(len(index), num)):
+            values[k] = row
+    return values
+
+
+def parse_influence(rows, sections, errors):
+    # Fixed width values, ends with blank line
+    inf = sections['inf']
+    for _ in range(2):
+        next(rows)
+
+    lines = []
+    first = rows.lineno + 1
+    row = next(rows)
+    while row != '':
+        lines.append(row)
+        row = next(rows, '')
+
+    try:
+        inf.extend(values / 1000 for values in decode_fixed_width(lines))
+    except (ValueError, UnicodeEncodeError):
+        # decode line by line, bad values are nan
+        for k, line in enumerate(lines):
+            # Characteres per value (since sometimes no whitespace between)
+            num = int(len(line) / 10)
+            skip = len(line) - 10*num
+            values = []
+            reason = ''
+            for i in range(num):
+                try:
+                    values.append(float(line[skip+i*10:skip+i*10+10])/1000)
+                except ValueError as e:
+                    values.append(nan)
+                    reason = str(e)
+            if reason:
+                errors.add('inf', first + k, line, reason)
+            inf.append(values)
+    return row
+
+
+# Section header (first field of line) : handler
+SECTION_HANDLERS = {
+    " NODES": partial(parse_table, key='nodes', skip=0, end=" ELEMEN DEF",
+                      types=(int, float)),
+    " BEAM TYPES ": partial(parse_table, key='elements', skip=0, end=" CONC MASS",
+                            types=(float, float, float, float, float)),
+    " CONC MASS": partial(parse_table, key='conc_masses', skip=0, end=" CONC SPRING",
+                          types=(int, int, float)),
+    " CONC SPRING": partial(parse_table, key='conc_springs', skip=0, end=" CONC DAMP",
+                            types=(int, int, float)),
+    " CONC DAMP": partial(parse_table, key='conc_damps', skip=0,
+                          end=" Force No.   Type    Node   DOF", types=(int, int, float)),
+    " Force No.   Type    Node   DOF": partial(parse_table, key='forces', skip=2,
+                                               end="           SPRING REACTIONS",
+                                               types=(int, int, int, int, float)),
+    "           SPRING REACTIONS": partial(parse_table, key='spring_reacts', skip=4,
+                                           end="           DISPLACEMENTS",
+                                           types=(int, int, float)),
+    "           DISPLACEMENTS": partial(parse_table, key='disps', skip=5,
+                                        end="    BEAM FORCES", types=(int, float, float)),
+    "    BEAM FORCES": partial(parse_table, key='beam_forces', skip=3,
+                               end="Bearing Reactions", types=(int, int, float, float)),
+    "Bearing Reactions": parse_bearing_reactions,
+    "Influence Coefficients": parse_influence,
+}
+
+# Section keys, in same order as SECTION_HANDLERS
+SECTION_KEYS = ('nodes', 'elements', 'conc_masses', 'conc_springs', 'conc_damps',
+                'forces', 'spring_reacts', 'disps', 'beam_forces', 'brg_reacts', 'inf')
+
+# Result sections repeated for each load case (eg. hot, cold, ballast)
+CASE_KEYS = ('forces', 'spring_reacts', 'disps', 'beam_forces', 'brg_reacts')
+
+# Sections needed to assemble results, reported if missing
+REQUIRED_KEYS = ('nodes', 'elements', 'conc_springs', 'disps', 'beam_forces', 'inf')
+
+# Section header : section key
+HEADER_KEYS = dict(zip(SECTION_HANDLERS, SECTION_KEYS))
+
+# Header line in file as bytes, header is first tab separated field of line
+HEADER_PATTERN = re.compile(b'^(' + b'|'.join(re.escape(header.encode()) for header in SECTION_HANDLERS)
+                            + b')(?:\t[^\n]*)?\r?$', re.MULTILINE)
+
+
+def find_headers(data):
+    # (section key, byte offset of header line) for each section header in data (bytes or mmap)
+    return [(HEADER_KEYS[match.group(1).decode()], match.start())
+            for match in HEADER_PATTERN.finditer(data)]
+
+
+def section_digests(filename):
+    # Hash of each section's raw text (header line up to next header), without parsing
+    # Used to find which sections changed between two versions of a file
+    digests = dict()
+    with open(filename, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            return digests
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            headers = find_headers(data)
+            ends = [start for _, start in headers[1:]] + [len(data)]
+            for (key, start), end in zip(headers, ends):
+                sha = digests.setdefault(key, hashlib.sha1())
+                sha.update(data[start:end])
+    return {key: sha.hexdigest() for key, sha in digests.items()}
+
+
+def parse_sections(filename, chunk_size=CHUNK_SIZE, keys=None, errors=None):
+    # Single pass over SHAFT.OUT, returns dict of section key : list of rows
+    # Result sections (CASE_KEYS) seen again start a new load case, sections['cases'] is
+    # list of case key : rows for each case, section keys hold rows of first case
+    # keys : only parse these sections (others are left empty), default all
+    # errors : ParseErrors to collect bad lines in (default new one), also sections['errors']
+    # Raises OSError if file can't be opened, ParseError on bad line if errors is strict
+    if errors is None:
+        errors = ParseErrors()
+    sections = {key: [] for key in SECTION_KEYS}
+    cases = [{key: sections[key] for key in CASE_KEYS}]
+    seen = set()
+    handlers = {header: handler for header, handler in SECTION_HANDLERS.items()
+                if keys is None or HEADER_KEYS[header] in keys}
+
+    # non ASCII bytes (eg. in titles) are replaced, so they only matter in values, which are
+    # then recorded as bad lines (same decoding as shaftindex)
+    with open(filename, "r", encoding='ascii', errors='replace') as file:
+        rows = Rows(file, chunk_size)
+        row = next(rows, None)
+        while row is not None:
+            handler = handlers.get(row)
+            if handler is None:
+                row = next(rows, None)
+                continue
+
+            key = HEADER_KEYS[row]
+            target = sections
+            if key in CASE_KEYS:
+                if key in seen:
+                    # repeated result block, next load case
+                    cases.append({key: [] for key in CASE_KEYS})
+                    seen = set()
+                seen.add(key)
+                target = cases[-1]
+
+            try:
+                # handler returns the row that ended its section, check it as a header
+                with instrument.stage('parse ' + key):
+                    row = handler(rows, target, errors)
+            except StopIteration:
+                # file ends inside section (truncated file)
+                errors.add(key, rows.lineno, '', 'end of file inside section')
+                break
+            except ParseError:
+                raise
+            # rest of section is skipped, continue with next header
+            except Exception as e:
+                errors.add(key, rows.lineno, row, f'section aborted, {type(e).__name__}: {e}')
+                row = next(rows, None)
+
+    for key in REQUIRED_KEYS:
+        if (keys is None or key in keys) and len(sections[key]) == 0:
+            errors.add(key, None, '', 'section not found')
+
+    sections['cases'] = cases
+    sections['errors'] = errors
+    return sections
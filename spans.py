@@ -0,0 +1,39 @@
+# Bearing span metrics from cumulative sums over element properties
+# Any span between two nodes is a difference of two prefix sums, so spans are
+# evaluated in bulk without looping over the elements between them.
+# Diameter is the length weighted average sqrt(sum(length * od^2) / span length)
+
+import numpy as np
+
+
+class Spans:
+    # Prefix sums of one shaft model, for spans between any node pairs
+    # x : node positions (m), length, od, mass : per element (m, m, kg)
+
+    def __init__(self, x, length, od, mass):
+        self.x = np.asarray(x, dtype=float)
+        self._ld2 = np.concatenate(([0.0], np.cumsum(np.asarray(length) * np.asarray(od)**2)))
+        self._mass = np.concatenate(([0.0], np.cumsum(mass)))
+
+    @classmethod
+    def from_model(cls, model):
+        # from ShaftModel
+        return cls(model.x, model.length, model.od, model.mass)
+
+    def metrics(self, first, second):
+        # Span metrics between node numbers first and second (scalars or arrays)
+        # Returns dict of arrays: length (m), diameter (m), ld (length / diameter), mass (kg)
+        # Zero length spans have nan diameter and L/D
+        a = np.minimum(first, second) - 1
+        b = np.maximum(first, second) - 1
+        length = self.x[b] - self.x[a]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diameter = np.sqrt((self._ld2[b] - self._ld2[a]) / length)
+            ld = length / diameter
+        return dict({'length' : length, 'diameter' : diameter, 'ld' : ld,
+                     'mass' : self._mass[b] - self._mass[a]})
+
+    def consecutive(self, nodes):
+        # Metrics of spans between each node and the next (eg. bearing nodes)
+        nodes = np.asarray(nodes, dtype=int)
+        return self.metrics(nodes[:-1], nodes[1:])
@@ -0,0 +1,146 @@
+# Synthetic Shaftkit MSA SHAFT.OUT files for benchmarks
+# Writes every section read by shaftout.parse_sections for a shaft of any size
+# Values are smooth made up curves, not a solved model
+# Run: python synthetic.py SHAFT.OUT --nodes 10000 --bearings 6 [--cases 3]
+
+import argparse
+from math import pi, sin, cos
+import random
+
+# Lines written to file at a time
+BLOCK = 50000
+
+
+def _blocks(lines):
+    # Join generated lines into text blocks of BLOCK lines
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) == BLOCK:
+            yield '\n'.join(block) + '\n'
+            block = []
+    if block:
+        yield '\n'.join(block) + '\n'
+
+
+def bearing_nodes(n_nodes, n_brgs):
+    # Bearings spread evenly along shaft, first at node 1, last one node from end
+    if n_brgs == 1:
+        return [1]
+    return [1 + round(k * (n_nodes - 2) / (n_brgs - 1)) for k in range(n_brgs)]
+
+
+def shaft_out_lines(n_nodes, n_brgs=4, seed=0, spacing=0.05, cases=1):
+    # Generate lines of a SHAFT.OUT file (without line endings) with cases load cases
+    rnd = random.Random(seed)
+    n_elems = n_nodes - 1
+    length = n_elems * spacing
+    brgs = bearing_nodes(n_nodes, n_brgs)
+    masses = sorted(rnd.sample(range(2, n_nodes), min(10, max(n_nodes - 2, 0))))
+
+    yield ' SHAFTKIT MSA V2  (synthetic model)'
+    yield ''
+
+    yield ' NODES'
+    for i in range(n_nodes):
+        yield f'{i+1:8d}{i*spacing:14.6f}'
+
+    yield ' ELEMEN DEF'
+    for i in range(n_elems):
+        yield f'{i+1:8d}{i+1:8d}{i+2:8d}{i+1:8d}'
+
+    # outer diameter steps along shaft, bore in part of it
+    yield ' BEAM TYPES '
+    for i in range(n_elems):
+        od = 0.3 + 0.1 * (i * 7 // n_elems % 3)
+        bore = 0.08 if i * 4 < n_elems else 0.0
+        yield f'{od:12.5f}{bore:12.5f} {2.06e11:.5E} {7.9e10:.5E} {7850.0:10.1f}'
+
+    yield ' CONC MASS'
+    for node in masses:
+        yield f'{node:8d}{1:8d}{rnd.uniform(500, 20000):14.3f}'
+
+    yield ' CONC SPRING'
+    for node in brgs:
+        yield f'{node:8d}{1:8d}{rnd.uniform(1e8, 5e9):14.5E}'
+
+    yield ' CONC DAMP'
+    for node in brgs:
+        yield f'{node:8d}{1:8d}{0.0:14.5E}'
+
+    # result blocks repeated for each load case, scaled so cases differ
+    for case in range(cases):
+        scale = 1 + 0.25 * case
+        yield ' Force No.   Type    Node   DOF'
+        yield ' --------------------------------------------'
+        yield ''
+        for k, node in enumerate(masses):
+            yield f'{k+1:8d}{1:8d}{node:8d}{1:8d}{-scale*rnd.uniform(1e3, 2e5):14.3f}'
+
+        yield '           SPRING REACTIONS'
+        yield ''
+        yield '   Node   DOF        Reaction'
+        yield ' --------------------------------------------'
+        yield ''
+        case_reactions = [scale * rnd.uniform(1e4, 5e5) for _ in brgs]
+        if case == 0:
+            reactions = case_reactions
+        for node, reaction in zip(brgs, case_reactions):
+            yield f'{node:8d}{1:8d}{reaction:14.4f}'
+
+        yield '           DISPLACEMENTS'
+        yield ''
+        yield '   Node      Displacement          Rotation'
+        yield '                 (m)                 (rad)'
+        yield ' --------------------------------------------'
+        yield ''
+        for i in range(n_nodes):
+            a = pi * i * spacing / length * 3
+            yield f'{i+1:8d}{-scale*1e-3*sin(a):16.8E}{-scale*1e-3*cos(a)*3*pi/length:16.8E}'
+
+        yield '    BEAM FORCES'
+        yield ''
+        yield '  Element  Node       Shear            Moment'
+        yield ' --------------------------------------------'
+        for i in range(n_elems):
+            for node in (i + 1, i + 2):
+                a = pi * (node - 1) * spacing / length * 3
+                yield f'{i+1:8d}{node:8d}{scale*2e5*cos(a):16.6E}{scale*5e5*sin(a):16.6E}'
+
+        yield 'Bearing Reactions'
+        yield ''
+        yield '    Vertical   Horizontal     Total'
+        yield ' --------------------------------------------'
+        yield ''
+        yield f'{case_reactions[0]:12.4f}{0.0:12.4f}{case_reactions[0]:12.4f}'
+
+    # fixed width 10 characters, large values have no space between
+    yield 'Influence Coefficients'
+    yield '  Straight line reactions, influence (N/mm)'
+    yield ' --------------------------------------------'
+    yield '  ' + ''.join(f'{reaction:10.1f}' for reaction in reactions)
+    for j in range(n_brgs):
+        row = [-rnd.uniform(1e5, 1e6) for _ in range(n_brgs)]
+        row[j] = rnd.uniform(1e6, 9e6)
+        yield '  ' + ''.join(f'{value:10.1f}' for value in row)
+    yield ''
+    yield ' END OF OUTPUT'
+
+
+def write_shaft_out(filename, n_nodes, n_brgs=4, seed=0, cases=1):
+    # Write synthetic SHAFT.OUT with n_nodes nodes, n_brgs bearings and cases load cases
+    with open(filename, 'w') as file:
+        for block in _blocks(shaft_out_lines(n_nodes, n_brgs, seed, cases=cases)):
+            file.write(block)
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description='Write synthetic SHAFT.OUT file')
+    cli.add_argument('filename', nargs='?', default='SHAFT.OUT')
+    cli.add_argument('--nodes', type=int, default=1000)
+    cli.add_argument('--bearings', type=int, default=4)
+    cli.add_argument('--seed', type=int, default=0)
+    cli.add_argument('--cases', type=int, default=1, help='number of load cases (result blocks)')
+    args = cli.parse_args()
+
+    write_shaft_out(args.filename, args.nodes, args.bearings, args.seed, args.cases)
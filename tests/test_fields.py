@@ -0,0 +1,52 @@
+# Sampling of results between nodes
+# Run: python -m pytest tests
+
+import numpy as np
+from benchmark import PARITY_TOL
+from fields import Fields
+from shaftmodel import assemble
+from shaftout import parse_sections
+from synthetic import write_shaft_out
+
+
+def test_sample_at_nodes_matches_output(tmp_path):
+    # output block has shear right of each node, moment left of it and stress from moment
+    # and section of element right of node (moment continuous at nodes of synthetic file)
+    filename = tmp_path / 'SHAFT.OUT'
+    write_shaft_out(filename, 1001, 4, cases=2)
+    sections = parse_sections(filename)
+    results = assemble(sections, ['N/A'] * len(sections['conc_springs']))
+    for case in range(results.n_cases):
+        fields = Fields.from_results(results, case)
+        assert fields.end_forces is not None
+        output = results.case_output[case]
+        right = fields.sample(results.x, ('disp', 'slope', 'shear', 'stress'), side='right')
+        left = fields.sample(results.x, ('disp', 'slope', 'moment'), side='left')
+        for row, name in [(0, 'disp'), (1, 'slope'), (2, 'shear'), (4, 'stress')]:
+            assert np.allclose(right[name], output[row], rtol=PARITY_TOL, atol=1e-12)
+        for row, name in [(0, 'disp'), (1, 'slope'), (3, 'moment')]:
+            assert np.allclose(left[name], output[row], rtol=PARITY_TOL, atol=1e-12)
+
+
+def test_sample_side_at_node_with_jump():
+    # two elements, shear and moment jump at middle node
+    output = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, -1.0], [1.0, 5.0, 6.0],
+                       [10.0, 20.0, 40.0], [100.0, 200.0, 400.0]])
+    end_forces = np.array([[1.0, 5.0], [2.0, 6.0], [10.0, 30.0], [20.0, 40.0]])
+    fields = Fields([0.0, 1.0, 2.0], output, end_forces, np.array([10.0, 20.0]))
+    right = fields.sample([1.0], side='right')
+    left = fields.sample([1.0], side='left')
+    assert (right['shear'][0], right['moment'][0], right['stress'][0]) == (5.0, 30.0, 600.0)
+    assert (left['shear'][0], left['moment'][0], left['stress'][0]) == (2.0, 20.0, 200.0)
+    assert fields.sample([0.5], ('shear',))['shear'][0] == 1.5
+
+
+def test_sample_without_stress_factor():
+    # end forces without section properties, stress interpolated between nodes
+    output = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, -1.0], [1.0, 5.0, 6.0],
+                       [10.0, 20.0, 40.0], [100.0, 200.0, 400.0]])
+    end_forces = np.array([[1.0, 5.0], [2.0, 6.0], [10.0, 30.0], [20.0, 40.0]])
+    fields = Fields([0.0, 1.0, 2.0], output, end_forces)
+    values = fields.sample([0.5, 1.5])
+    assert values['stress'].tolist() == [150.0, 300.0]
+    assert values['moment'].tolist() == [15.0, 35.0]
@@ -0,0 +1,143 @@
+# Results service driven by a local HTTP client
+# Run: python -m pytest tests
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import pytest
+import service
+from parser import read_results
+from synthetic import write_shaft_out
+
+BRG_NAMES = ['aft', 'mid', 'fwd']
+
+
+@pytest.fixture
+def files(tmp_path):
+    # served folder with SHAFT.OUT, a run in a sub folder and a file outside the folder
+    root = tmp_path / 'runs'
+    (root / 'b').mkdir(parents=True)
+    write_shaft_out(str(root / 'SHAFT.OUT'), 40, 3, cases=2)
+    write_shaft_out(str(root / 'b' / 'SHAFT.OUT'), 40, 3, seed=1)
+    write_shaft_out(str(tmp_path / 'OUTSIDE.OUT'), 30, 3)
+    (root / 'bad.OUT').write_text('nothing to read here\n')
+    return tmp_path
+
+
+def start(root, default_file='SHAFT.OUT', load=None):
+    # Service on a free port, returns get(path) -> (status, content type, body) and loaded files
+    loaded = []
+    def read(filename, errors):
+        loaded.append(filename)
+        return read_results(filename, BRG_NAMES, None, errors)
+    server = service.create_server(service.Service(service.ResultsCache(load or read), str(root),
+                                                   default_file), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path):
+        try:
+            with urlopen(f'http://127.0.0.1:{server.server_address[1]}{path}') as response:
+                return response.status, response.headers['Content-Type'], response.read()
+        except HTTPError as e:
+            return e.code, e.headers['Content-Type'], e.read()
+    return server, get, loaded
+
+
+@pytest.fixture
+def client(files):
+    server, get, loaded = start(files / 'runs')
+    yield get, loaded
+    server.shutdown()
+    server.server_close()
+
+
+def get_json(get, path, status=200):
+    code, content_type, body = get(path)
+    assert code == status
+    assert content_type == 'application/json'
+    return json.loads(body)
+
+
+def test_endpoints(client):
+    get, _ = client
+    summary = get_json(get, '/summary')
+    assert summary['n_nodes'] == 40 and summary['n_cases'] == 2
+    output = get_json(get, '/output?case=2')
+    assert len(output['node']) == 40
+    assert set(output) == {'node', 'x', 'disp', 'slope', 'shear', 'moment', 'stress'}
+    bearings = get_json(get, '/bearings')
+    assert bearings['name'] == BRG_NAMES and bearings['ld'][-1] is None
+    assert len(get_json(get, '/influence')['influence']) == 3
+    assert get_json(get, '/errors')['count'] == 0
+    assert get_json(get, '/output?file=b/SHAFT.OUT')['node'] == output['node']
+
+
+def test_concurrent_requests_parse_once(client):
+    get, loaded = client
+    with ThreadPoolExecutor(8) as pool:
+        statuses = [status for status, _, _ in pool.map(get, ['/output'] * 8)]
+    assert statuses == [200] * 8
+    assert len(loaded) == 1
+
+
+def test_changed_file_is_reparsed(client, files):
+    get, loaded = client
+    get_json(get, '/summary')
+    get_json(get, '/summary')
+    assert len(loaded) == 1
+    write_shaft_out(str(files / 'runs' / 'SHAFT.OUT'), 50, 3)
+    assert get_json(get, '/summary')['n_nodes'] == 50
+    assert len(loaded) == 2
+
+
+def test_bad_requests(client):
+    get, _ = client
+    assert 'outside' in get_json(get, '/output?file=../OUTSIDE.OUT', 403)['error']
+    get_json(get, '/output?file=missing.OUT', 404)
+    get_json(get, '/output?case=3', 404)
+    get_json(get, '/output?case=x', 400)
+    get_json(get, '/nothing', 404)
+
+
+def test_unreadable_file_errors_are_served(client):
+    get, loaded = client
+    assert 'could not be assembled' in get_json(get, '/output?file=bad.OUT', 422)['error']
+    errors = get_json(get, '/errors?file=bad.OUT')
+    assert errors['count'] > 0 and errors['error']
+    assert {record['reason'] for record in errors['records']} == {'section not found'}
+    assert len(loaded) == 1
+
+
+def test_default_file_outside_folder(files):
+    # shaft_out_location setting may be anywhere, it is served as default file only
+    server, get, _ = start(files / 'runs', str(files / 'OUTSIDE.OUT'))
+    try:
+        assert get_json(get, '/summary')['n_nodes'] == 30
+        assert get_json(get, '/files')['files'][0]['file'] == os.path.realpath(files / 'OUTSIDE.OUT')
+        assert get_json(get, '/output?file=SHAFT.OUT')['node'][-1] == 40
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unexpected_error_answered(files):
+    def load(filename, errors):
+        raise RuntimeError('broken')
+    server, get, _ = start(files / 'runs', load=load)
+    try:
+        assert get_json(get, '/summary', 500)['error'] == 'RuntimeError: broken'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_plot(client):
+    pytest.importorskip('matplotlib')
+    get, _ = client
+    status, content_type, body = get('/plots/moment.png')
+    assert (status, content_type) == (200, 'image/png')
+    assert body.startswith(b'\x89PNG')
+    get_json(get, '/plots/nothing.png', 404)
@@ -0,0 +1,27 @@
+# Vectorized model assembly against the original per element / per node loops
+# Run: python -m pytest tests
+
+import numpy as np
+import pytest
+from benchmark import PARITY_TOL, SUM_TOL, assembly_diffs, synthetic_sections
+from shaftmodel import assemble
+
+
+@pytest.mark.parametrize('n_elems, n_brgs', [(2, 2), (11, 3), (1000, 4), (20000, 6)])
+def test_assembly_matches_loops(n_elems, n_brgs):
+    model, output, mass = assembly_diffs(synthetic_sections(n_elems, n_brgs, seed=n_elems))
+    assert model < PARITY_TOL
+    assert output < PARITY_TOL
+    assert mass < SUM_TOL
+
+
+def test_assembly_from_arrays_same_as_lists():
+    # sections as 2D arrays (as loaded from section cache) instead of parsed lists
+    sections = synthetic_sections(500)
+    arrays = {key: np.array(rows, dtype=float) for key, rows in sections.items()}
+    names = ['N/A'] * len(sections['conc_springs'])
+    from_lists = assemble(sections, names)
+    from_arrays = assemble(arrays, names)
+    assert np.array_equal(from_lists.model.elements, from_arrays.model.elements)
+    assert np.array_equal(from_lists.output, from_arrays.output)
+    assert np.array_equal(from_lists.bearings, from_arrays.bearings)
@@ -0,0 +1,132 @@
+# shaftout influence decoding against the original one slice at a time decoding
+# Run: python -m pytest tests
+
+import io
+import random
+import numpy as np
+import pytest
+from benchmark import decode_slicing
+from shaftout import ParseError, ParseErrors, Rows, decode_fixed_width, parse_influence, parse_sections
+from synthetic import write_shaft_out
+
+
+def field(rnd):
+    # 10 character value, sometimes filling the whole field (no whitespace before it)
+    return f'{rnd.uniform(-1e7, 1e7):10.1f}'[-10:]
+
+
+def assert_same(decoded, reference):
+    assert len(decoded) == len(reference)
+    for values, expected in zip(decoded, reference):
+        assert list(values) == expected
+
+
+@pytest.mark.parametrize('lead', range(10))
+def test_leading_characters_skipped(lead):
+    # characters that don't fill a whole field at start of line are skipped
+    rnd = random.Random(lead)
+    lines = [' ' * lead + ''.join(field(rnd) for _ in range(5)) for _ in range(6)]
+    assert_same(decode_fixed_width(lines), decode_slicing(lines))
+
+
+def test_leading_non_blank_characters_skipped():
+    lines = ['ab' + '    1234.5' + '   -6789.0', '7' + '       1.5']
+    assert_same(decode_fixed_width(lines), decode_slicing(lines))
+    assert list(decode_fixed_width(lines)[0]) == [1234.5, -6789.0]
+
+
+def test_fields_without_whitespace():
+    lines = ['-1234567.8' * 4, ' 9999999.9-8888888.8', '1234567.891234567.89']
+    decoded = decode_fixed_width(lines)
+    assert_same(decoded, decode_slicing(lines))
+    assert list(decoded[1]) == [9999999.9, -8888888.8]
+    assert list(decoded[2]) == [1234567.89, 1234567.89]
+
+
+def test_mixed_field_counts():
+    # lines with different numbers of values are decoded in separate blocks, order is kept
+    rnd = random.Random(1)
+    lines = [' ' * (k % 10) + ''.join(field(rnd) for _ in range(1 + k % 4)) for k in range(40)]
+    assert_same(decode_fixed_width(lines), decode_slicing(lines))
+
+
+def test_empty():
+    assert decode_fixed_width([]) == []
+    assert list(decode_fixed_width(['   '])[0]) == []
+
+
+def test_bad_field_raises():
+    with pytest.raises(ValueError):
+        decode_fixed_width(['    1234.5   ##.#abc'])
+
+
+def influence_rows(lines):
+    # Rows iterator positioned after the Influence Coefficients header
+    text = '\n'.join(['Influence Coefficients', 'header', 'header', *lines, '', 'rest'])
+    rows = Rows(io.StringIO(text))
+    next(rows)
+    return rows
+
+
+def test_parse_influence_fallback_keeps_good_values():
+    # a bad field gives nan for that value only, other values and lines are kept (kN/mm)
+    lines = ['  ' + '    1000.0' + '   -2000.0', '  ' + '    3000.0' + '   ##.####', '       5000.0']
+    sections = dict({'inf' : []})
+    errors = ParseErrors()
+    row = parse_influence(influence_rows(lines), sections, errors)
+
+    assert row == ''
+    inf = sections['inf']
+    assert [list(values) for values in inf[:1]] == [[1.0, -2.0]]
+    assert inf[1][0] == 3.0 and np.isnan(inf[1][1])
+    assert list(inf[2]) == [5.0]
+    assert len(errors) == 1
+    assert errors.records[0]['section'] == 'inf'
+    assert errors.records[0]['line'] == 5
+    assert errors.records[0]['text'] == lines[1]
+
+
+def test_parse_influence_matches_slicing():
+    rnd = random.Random(2)
+    lines = [' ' * (k % 10) + ''.join(field(rnd) for _ in range(4)) for k in range(5)]
+    sections = dict({'inf' : []})
+    errors = ParseErrors()
+    parse_influence(influence_rows(lines), sections, errors)
+    assert not errors
+    expected = [[value / 1000 for value in values] for values in decode_slicing(lines)]
+    assert [list(values) for values in sections['inf']] == expected
+
+
+def test_parse_influence_strict_raises():
+    lines = ['    1000.0   ##.####']
+    with pytest.raises(ParseError):
+        parse_influence(influence_rows(lines), dict({'inf' : []}), ParseErrors(strict=True))
+
+
+def test_truncated_file_recorded(tmp_path):
+    filename = tmp_path / 'SHAFT.OUT'
+    write_shaft_out(str(filename), 50, 3)
+    text = filename.read_text()
+    filename.write_text(text[:text.index('    BEAM FORCES') + 200])
+
+    errors = parse_sections(str(filename))['errors']
+    assert errors.counts['beam_forces'] >= 1
+    assert any(record['reason'] == 'end of file inside section' for record in errors.records)
+
+
+def test_non_ascii_bytes(tmp_path):
+    # undecodable bytes in a title are ignored, in a value the line is recorded
+    filename = tmp_path / 'SHAFT.OUT'
+    write_shaft_out(str(filename), 50, 3)
+    clean = parse_sections(str(filename))
+    lines = filename.read_bytes().split(b'\n')
+    row = lines.index(b'           DISPLACEMENTS') + 6
+    lines.insert(0, b'Caf\xe9 title')
+    lines[row + 1] = lines[row + 1].replace(b'E', b'\xff', 1)
+    filename.write_bytes(b'\n'.join(lines))
+
+    sections = parse_sections(str(filename))
+    assert sections['errors'].counts == dict({'disps' : 1})
+    assert sections['errors'].records[0]['line'] == row + 2
+    assert len(sections['disps']) == len(clean['disps'])
+    assert sections['nodes'] == clean['nodes']
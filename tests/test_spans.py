@@ -0,0 +1,31 @@
+# Prefix sum span metrics against the original one element at a time sums
+# Run: python -m pytest tests
+
+import random
+import numpy as np
+import pytest
+from benchmark import SUM_TOL, max_rel_diff, span_loops
+from spans import Spans
+
+
+@pytest.mark.parametrize('n_elems, n_brgs', [(3, 2), (100, 4), (20000, 60)])
+def test_span_diameter_matches_loops(n_elems, n_brgs):
+    rnd = random.Random(n_elems)
+    x = [i * 0.05 for i in range(n_elems + 1)]
+    length = [0.05] * n_elems
+    od = [rnd.uniform(0.2, 0.6) for _ in range(n_elems)]
+    brg_nodes = sorted(rnd.sample(range(1, n_elems + 2), n_brgs))
+
+    metrics = Spans(x, length, od, np.zeros(n_elems)).consecutive(brg_nodes)
+    assert max_rel_diff(metrics['diameter'], span_loops(x, length, od, brg_nodes)) < SUM_TOL
+
+
+def test_span_metrics():
+    # two elements of 1 m, od 0.2 and 0.4, masses 10 and 30 kg
+    spans = Spans([0.0, 1.0, 2.0], [1.0, 1.0], [0.2, 0.4], [10.0, 30.0])
+    metrics = spans.metrics(3, 1)
+    assert metrics['length'] == 2.0
+    assert metrics['diameter'] == pytest.approx(np.sqrt((0.04 + 0.16) / 2))
+    assert metrics['ld'] == pytest.approx(2.0 / np.sqrt(0.1))
+    assert metrics['mass'] == 40.0
+    assert np.isnan(spans.metrics(2, 2)['ld'])